@@ -1,9 +1,12 @@
-import pandas as pd
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from core.accounts.models import User
@@ -12,20 +15,42 @@ from core.business.serializers import (
     BusinessCreateUpdateSerializer,
     BusinessDeleteSerializer,
     BusinessListSerializer,
+    BusinessNearbySerializer,
     CouponCreateUpdateSerializer,
     CouponListSerializer,
 )
+from core.business.tasks import (
+    ANALYTICS_CACHE_KEY,
+    ANALYTICS_SCHEDULED_KEY,
+    refresh_business_analytics,
+)
+from core.config.geo import get_bounding_box, get_search_cells, haversine_km
+from core.config.pagination import (
+    get_page_params,
+    get_total_pages,
+    paginate_queryset_by_keyset,
+    paginate_queryset_by_offset,
+)
 from core.config.permissions import AdminOnlyPermission, BusinessOwnerPermission
 from core.config.schema import get_auto_schema_class_by_tags
+from core.config.services import (
+    get_not_modified_response,
+    make_etag,
+    set_validators,
+)
 from core.config.choices import UserType
 
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_MAX_LIMIT = 100
+
 
 class BusinessViewSet(
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Business.objects.all().order_by("name")
+    queryset = Business.objects.all().order_by("name", "id")
     permission_classes = [AdminOnlyPermission | BusinessOwnerPermission]
 
     def get_serializer_class(self):
@@ -59,7 +84,7 @@ class BusinessViewSet(
         )
         serializer.is_valid(raise_exception=True)
         business = serializer.update()
-        data = BusinessListSerializer(business, many=True).data
+        data = BusinessListSerializer(business).data
         return Response(data=data)
 
     @swagger_auto_schema(
@@ -70,15 +95,131 @@ class BusinessViewSet(
         if request.user.type == UserType.CUSTOMER:
             raise serializers.ValidationError({"detail": "Not authorized"})
 
+        page, limit = get_page_params(request)
+        cursor = request.GET.get("cursor")
         business_qs = self.get_queryset()
-        businesses = pd.DataFrame(business_qs.values())
-        print(businesses)
-
         if request.user.type == UserType.SHOP_OWNER:
             business_qs = business_qs.filter(owner=self.request.user)
+        page_qs = business_qs.with_owner_name().select_related("logo_asset")
 
-        data = self.get_serializer(business_qs, many=True).data
-        return Response(data=data)
+        validators = business_qs.aggregate(
+            count=Count("id"), last_modified=Max("updated_at")
+        )
+        etag = make_etag(
+            request.user.pk,
+            validators["count"],
+            validators["last_modified"],
+            request.GET.urlencode(),
+        )
+        # Max(updated_at) cannot see deletes, so it only feeds the ETag (with
+        # the count) and is never sent as Last-Modified on its own.
+        not_modified = get_not_modified_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+
+        # The count comes from the validators query, so neither kind of page
+        # counts again; keyset pages only skip the OFFSET scan.
+        total_count = validators["count"]
+        res = {}
+        if cursor is not None:
+            businesses, res["next_cursor"] = paginate_queryset_by_keyset(
+                page_qs, cursor, limit
+            )
+        else:
+            total_count, businesses = paginate_queryset_by_offset(
+                page_qs, page, limit, count=total_count
+            )
+
+        data = self.get_serializer(businesses, many=True).data
+        response = Response(
+            {
+                "count": total_count,
+                "total_pages": get_total_pages(total_count, limit),
+                "data": data,
+                **res,
+            }
+        )
+        return set_validators(response, etag=etag)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter("lat", openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter("lon", openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter(
+                "radius",
+                openapi.IN_QUERY,
+                description=f"kilometres, at most {NEARBY_MAX_RADIUS_KM}",
+                type=openapi.TYPE_NUMBER,
+            ),
+            openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={status.HTTP_200_OK: BusinessNearbySerializer},
+    )
+    @action(detail=False, methods=["GET"], permission_classes=[AllowAny])
+    def nearby(self, request, *args, **kwargs):
+        try:
+            latitude = float(request.GET["lat"])
+            longitude = float(request.GET["lon"])
+            radius = float(request.GET.get("radius", NEARBY_DEFAULT_RADIUS_KM))
+            limit = int(request.GET.get("limit", 20))
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({"detail": "Invalid lat, lon or radius"})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and radius > 0):
+            raise serializers.ValidationError({"detail": "Invalid lat, lon or radius"})
+        radius = min(radius, NEARBY_MAX_RADIUS_KM)
+        limit = min(max(limit, 1), NEARBY_MAX_LIMIT)
+
+        # Prune to the geohash cells around the point, then rank the
+        # candidates by exact distance in one vectorized pass.
+        candidates = Business.objects.exclude(latitude=None).exclude(longitude=None)
+        cells = get_search_cells(latitude, longitude, radius)
+        if cells is not None:
+            dlat, dlon = get_bounding_box(latitude, radius)
+            candidates = candidates.within(cells).filter(
+                latitude__range=(latitude - dlat, latitude + dlat)
+            )
+            if -180 <= longitude - dlon and longitude + dlon <= 180:
+                candidates = candidates.filter(
+                    longitude__range=(longitude - dlon, longitude + dlon)
+                )
+        rows = np.array(
+            list(candidates.values_list("id", "latitude", "longitude")), dtype=float
+        ).reshape(-1, 3)
+
+        distances = haversine_km(latitude, longitude, rows[:, 1], rows[:, 2])
+        inside = np.flatnonzero(distances <= radius)
+        nearest = inside[np.argsort(distances[inside], kind="stable")[:limit]]
+        distance_by_id = {int(rows[i, 0]): float(distances[i]) for i in nearest}
+
+        businesses = Business.objects.in_bulk(list(distance_by_id))
+        data = BusinessNearbySerializer(
+            [businesses[pk] for pk in distance_by_id if pk in businesses],
+            many=True,
+            context={"distances": distance_by_id},
+        ).data
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
+    @action(detail=False, methods=["GET"])
+    def analytics(self, request, *args, **kwargs):
+        analytics = cache.get(ANALYTICS_CACHE_KEY)
+        if analytics is None:
+            if cache.add(ANALYTICS_SCHEDULED_KEY, 1, 60 * 5):
+                refresh_business_analytics.delay()
+            return Response(
+                data={"detail": "Analytics are being computed, try again shortly"},
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        businesses = analytics["businesses"]
+        if request.user.type == UserType.SHOP_OWNER:
+            owned = set(
+                Business.objects.filter(owner=request.user).values_list("id", flat=True)
+            )
+            businesses = [b for b in businesses if b["id"] in owned]
+
+        data = {"computed_at": analytics["computed_at"], "businesses": businesses}
+        return Response(data=data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
     @action(detail=True, methods=["POST"])
@@ -86,28 +227,24 @@ class BusinessViewSet(
         if request.user.type != UserType.CUSTOMER:
             raise serializers.ValidationError({"detail": "Action not allowed"})
 
-        if BusinessFavorite.objects.filter(
-            business=self.get_object(), user=request.user
-        ).exists():
+        business = self.get_object()
+        if not BusinessFavorite.objects.add(request.user, business):
             raise serializers.ValidationError(
                 {"detail": "This shop is already in your favorites list"}
             )
-
-        BusinessFavorite.objects.create(business=self.get_object(), user=request.user)
         return Response()
 
     @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
     @action(detail=True, methods=["POST"])
     def remove_business_from_favorites(self, request, *args, **kwargs):
-        if request.user == self.get_object().owner:
+        business = self.get_object()
+        if request.user == business.owner:
             raise serializers.ValidationError({"detail": "Action not allowed"})
 
         if request.user.type != UserType.CUSTOMER:
             raise serializers.ValidationError({"detail": "Action not allowed"})
 
-        BusinessFavorite.objects.filter(
-            business=self.get_object(), user=request.user
-        ).delete()
+        BusinessFavorite.objects.remove(request.user, business)
         return Response()
 
     @swagger_auto_schema(
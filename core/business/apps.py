@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BusinessConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core.business"
+
+    def ready(self):
+        from core.business import signals  # noqa: F401
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:30
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("business", "0001_initial"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="business",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="business_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
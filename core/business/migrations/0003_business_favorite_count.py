@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("business", "0002_business_business_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="favorite_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE business_business SET favorite_count = favorites.count
+            FROM (
+                SELECT business_id, count(*) AS count
+                FROM business_businessfavorite
+                GROUP BY business_id
+            ) AS favorites
+            WHERE favorites.business_id = business_business.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
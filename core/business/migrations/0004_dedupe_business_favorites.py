@@ -0,0 +1,32 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("business", "0003_business_favorite_count"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            DELETE FROM business_businessfavorite AS duplicate
+            USING business_businessfavorite AS kept
+            WHERE duplicate.user_id = kept.user_id
+                AND duplicate.business_id = kept.business_id
+                AND duplicate.id > kept.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE business_business SET favorite_count = (
+                SELECT count(*) FROM business_businessfavorite
+                WHERE business_businessfavorite.business_id = business_business.id
+            )
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("business", "0004_dedupe_business_favorites"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="businessfavorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "business"), name="business_favorite_unique_user"
+            ),
+        ),
+    ]
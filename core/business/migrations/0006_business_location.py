@@ -0,0 +1,28 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("business", "0005_businessfavorite_business_favorite_unique_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="geohash",
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name="business",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="business",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
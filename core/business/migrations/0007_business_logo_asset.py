@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("config", "0001_image_asset"),
+        ("business", "0006_business_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="logo_asset",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="business_logos",
+                to="config.imageasset",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="business",
+            name="logo",
+            field=models.ImageField(blank=True, upload_to="static/businesses/"),
+        ),
+    ]
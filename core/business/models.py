@@ -1,29 +1,54 @@
 from uuid import uuid4
 
 from django.conf import settings
-from django.db import models
+from django.db import connection, models
+from django.db.models import Value
+from django.db.models.functions import Concat, Trim
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import TrigramWordSimilarity
 
 from django_countries.fields import CountryField
-from imagekit.models.fields import ProcessedImageField
-from pilkit.processors.resize import ResizeToFit
 
 from core.config.choices import BusinessRating
+from core.config.geo import encode_geohash
 
 
 # Create your models here.
+class BusinessQuerySet(models.QuerySet):
+    def within(self, cells):
+        condition = models.Q()
+        for cell in cells:
+            condition |= models.Q(geohash__startswith=cell)
+        return self.filter(condition)
+
+    def with_owner_name(self):
+        return self.annotate(
+            owner_name=Trim(Concat("owner__first_name", Value(" "), "owner__last_name"))
+        )
+
+    def suggest(self, text, limit):
+        return (
+            self.filter(name__trigram_word_similar=text)
+            .annotate(similarity=TrigramWordSimilarity(text, "name"))
+            .order_by("-similarity", "name")
+            .values("id", "name")[:limit]
+        )
+
+
 class Business(models.Model):
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="businesses"
     )
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=30)
-    logo = ProcessedImageField(
-        upload_to="static/businesses/",
+    logo = models.ImageField(upload_to="static/businesses/", blank=True)
+    logo_asset = models.ForeignKey(
+        "config.ImageAsset",
+        on_delete=models.SET_NULL,
+        null=True,
         blank=True,
-        processors=[ResizeToFit(300, 300)],
-        format="PNG",
-        options={"quality": 90},
+        related_name="business_logos",
     )
     coupon_code = models.CharField(max_length=64, blank=True)
     category = models.CharField(max_length=128, blank=True)
@@ -36,16 +61,77 @@ class Business(models.Model):
         default=BusinessRating.LEVEL_1,
     )
     notes = models.TextField(blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+    favorite_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BusinessQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=["name"],
+                name="business_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
     def is_owner(self, user):
         return self.owner == user
 
 
+class BusinessFavoriteQuerySet(models.QuerySet):
+    # Single statements that change the favorite row and the business counter
+    # together. Both return whether a row was actually added or removed.
+    add_sql = """
+        WITH inserted AS (
+            INSERT INTO {favorite} (user_id, business_id)
+            VALUES (%(user)s, %(business)s)
+            ON CONFLICT (user_id, business_id) DO NOTHING
+            RETURNING id
+        ), counted AS (
+            UPDATE {business} SET favorite_count = favorite_count + 1
+            WHERE id = %(business)s AND EXISTS (SELECT 1 FROM inserted)
+        )
+        SELECT EXISTS (SELECT 1 FROM inserted)
+    """
+    remove_sql = """
+        WITH deleted AS (
+            DELETE FROM {favorite} WHERE user_id = %(user)s AND business_id = %(business)s
+            RETURNING id
+        ), counted AS (
+            UPDATE {business} SET favorite_count = favorite_count - 1
+            WHERE id = %(business)s AND EXISTS (SELECT 1 FROM deleted)
+        )
+        SELECT EXISTS (SELECT 1 FROM deleted)
+    """
+
+    def execute(self, sql, user, business):
+        sql = sql.format(
+            favorite=self.model._meta.db_table, business=Business._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {"user": user.pk, "business": business.pk})
+            return cursor.fetchone()[0]
+
+    def add(self, user, business):
+        return self.execute(self.add_sql, user, business)
+
+    def remove(self, user, business):
+        return self.execute(self.remove_sql, user, business)
+
+
 class BusinessFavorite(models.Model):
     business = models.ForeignKey(
         Business, on_delete=models.CASCADE, related_name="favorites_count"
@@ -56,6 +142,15 @@ class BusinessFavorite(models.Model):
         related_name="favorite_shops",
     )
 
+    objects = BusinessFavoriteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "business"], name="business_favorite_unique_user"
+            )
+        ]
+
 
 class Coupon(models.Model):
     business = models.ForeignKey(
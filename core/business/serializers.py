@@ -1,11 +1,17 @@
 from django.db import transaction
+from django.utils import timezone
 
 import pyqrcode
+from django_countries.serializers import CountryFieldMixin
 from rest_framework import serializers
 
 from core.business.models import Business, Coupon
+from core.business.tasks import geocode_business
 from core.config.choices import UserType
+from core.config.media import create_image_asset
+from core.config.serializers import ImageAssetSerializer
 from core.config.utils import generate_code
+from core.product.cache import bump_catalog_version
 
 MAX_COUNT_OF_SHOPS_OWNED = 3
 
@@ -20,8 +26,29 @@ class BusinessBasicSerializer(serializers.ModelSerializer):
         ]
 
 
-class BusinessListSerializer(serializers.ModelSerializer):
+class BusinessNearbySerializer(serializers.ModelSerializer):
+    distance = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Business
+        fields = [
+            "id",
+            "name",
+            "phone",
+            "category",
+            "address",
+            "latitude",
+            "longitude",
+            "distance",
+        ]
+
+    def get_distance(self, obj):
+        return round(self.context["distances"][obj.pk], 3)
+
+
+class BusinessListSerializer(CountryFieldMixin, serializers.ModelSerializer):
     owner = serializers.SerializerMethodField()
+    logo_asset = ImageAssetSerializer(read_only=True)
 
     class Meta:
         model = Business
@@ -31,20 +58,27 @@ class BusinessListSerializer(serializers.ModelSerializer):
             "name",
             "phone",
             "logo",
+            "logo_asset",
             "coupon_code",
             "category",
             "country",
             "address",
+            "latitude",
+            "longitude",
             "established",
             "created_at",
             "updated_at",
         ]
 
     def get_owner(self, obj):
+        if hasattr(obj, "owner_name"):
+            return obj.owner_name
         return obj.owner.get_full_name()
 
 
 class BusinessCreateUpdateSerializer(serializers.ModelSerializer):
+    logo = serializers.ImageField(write_only=True, required=False)
+
     class Meta:
         model = Business
         fields = [
@@ -67,9 +101,15 @@ class BusinessCreateUpdateSerializer(serializers.ModelSerializer):
         if business_count == MAX_COUNT_OF_SHOPS_OWNED:
             raise serializers.ValidationError({"detail": "You have reached maximum"})
 
-        business = Business.objects.create(
-            **self.validated_data, owner=self.context["request"].user
-        )
+        data = dict(self.validated_data)
+        logo = data.pop("logo", None)
+        with transaction.atomic():
+            if logo is not None:
+                data["logo_asset"] = create_image_asset(logo)
+            business = Business.objects.create(
+                **data, owner=self.context["request"].user
+            )
+        transaction.on_commit(lambda: geocode_business.delay(business.pk))
         return business
 
     def update(self):
@@ -79,11 +119,23 @@ class BusinessCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"detail": "Not Allowed"})
 
         business = Business.objects.filter(pk=self.context["pk"])
-        if request.user != business.first().owner:
+        if not business.filter(owner=request.user).exists():
             raise serializers.ValidationError({"detail": "Not Allowed"})
 
-        business.update(**request.data)
-        return business
+        # Only the serializer's own fields are written. Location comes from the
+        # geocoder, and queryset.update() skips save(), which keeps geohash in
+        # step with latitude and longitude.
+        data = {k: v for k, v in self.validated_data.items() if k in request.data}
+        logo = data.pop("logo", None)
+        with transaction.atomic():
+            if logo is not None:
+                data["logo_asset"] = create_image_asset(logo)
+            business.update(updated_at=timezone.now(), **data)
+        bump_catalog_version([self.context["pk"]])
+        if "address" in request.data or "country" in request.data:
+            pk = self.context["pk"]
+            transaction.on_commit(lambda: geocode_business.delay(pk))
+        return business.with_owner_name().select_related("logo_asset").get()
 
     def to_representation(self, instance):
         return BusinessListSerializer(instance=instance, context=self.context).data
@@ -0,0 +1,16 @@
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.business.models import Business
+from core.config.media import image_asset_ready
+from core.product.cache import bump_catalog_version
+
+
+@receiver(image_asset_ready)
+def business_logo_ready(sender, asset, **kwargs):
+    # Touching updated_at moves the business list validators along with the
+    # logo.
+    businesses = Business.objects.filter(logo_asset=asset)
+    business_ids = list(businesses.values_list("id", flat=True))
+    businesses.update(updated_at=timezone.now())
+    bump_catalog_version(business_ids)
@@ -0,0 +1,86 @@
+from celery import shared_task
+from django.core.cache import cache
+from django.utils import timezone
+from django_countries import countries
+from geopy.exc import GeopyError
+
+from core.business.models import Business
+from core.config.geo import encode_geohash, get_geocoder
+from core.product.models import Product
+
+ANALYTICS_CACHE_KEY = "business:analytics"
+ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
+ANALYTICS_SCHEDULED_KEY = "business:analytics:scheduled"
+
+
+def compute_business_analytics():
+    # pandas is only needed here, so web workers never import it.
+    import pandas as pd
+
+    products = pd.DataFrame.from_records(
+        Product.objects.values_list("business_id", "category", "price").iterator(),
+        columns=["business_id", "category", "price"],
+    )
+    businesses = pd.DataFrame.from_records(
+        Business.objects.values_list("id", "name", "favorite_count").iterator(),
+        columns=["id", "name", "favorites"],
+        index="id",
+    )
+
+    stats = ["min", "max", "mean", "median"]
+    prices = products.groupby("business_id")["price"].agg(["count", *stats]).round(2)
+    categories = (
+        products.groupby(["business_id", "category"]).size().unstack(fill_value=0)
+    )
+
+    # One frame of plain values, so each record is only reshaped, not looked up.
+    frame = businesses.join(prices).join(categories)
+    frame["count"] = frame["count"].fillna(0)
+    frame[categories.columns] = frame[categories.columns].fillna(0)
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    rows = [
+        {
+            "id": int(record["id"]),
+            "name": record["name"],
+            "favorites": int(record["favorites"]),
+            "product_count": int(record["count"]),
+            "price": {stat: record[stat] for stat in stats},
+            "categories": {
+                category: int(record[category])
+                for category in categories.columns
+                if record[category]
+            },
+        }
+        for record in frame.reset_index().to_dict("records")
+    ]
+    return {"computed_at": timezone.now().isoformat(), "businesses": rows}
+
+
+@shared_task
+def refresh_business_analytics():
+    cache.set(
+        ANALYTICS_CACHE_KEY, compute_business_analytics(), ANALYTICS_CACHE_TIMEOUT
+    )
+    cache.delete(ANALYTICS_SCHEDULED_KEY)
+
+
+@shared_task(autoretry_for=(GeopyError,), retry_backoff=True, max_retries=3)
+def geocode_business(business_id):
+    business = Business.objects.filter(pk=business_id).first()
+    if business is None or not business.address:
+        return
+
+    query = business.address
+    if business.country:
+        query = f"{query}, {countries.name(business.country)}"
+    location = get_geocoder().geocode(query)
+    if location is None:
+        return
+
+    latitude, longitude = location
+    Business.objects.filter(pk=business_id).update(
+        latitude=latitude,
+        longitude=longitude,
+        geohash=encode_geohash(latitude, longitude),
+    )
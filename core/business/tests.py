@@ -1,3 +1,316 @@
-from django.test import TestCase
+import datetime
+import io
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.accounts.models import User
+from core.business.models import Business
+from core.business.tasks import (
+    compute_business_analytics,
+    geocode_business,
+    refresh_business_analytics,
+)
+from core.config.choices import ImageStatus, UserType
+from core.config.geo import encode_geohash, get_search_cells, haversine_km
+from core.product.models import Product
+
+
+@override_settings(
+    GEOCODING_BACKEND="core.config.geo.LocalGeocoder",
+    GEOCODING_LOCAL_PLACES={"12 marina road, nigeria": (6.4500, 3.4000)},
+)
+class NearbyBusinessTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            email="owner@example.com", password="pass1234", type=UserType.SHOP_OWNER
+        )
+
+    def create_business(self, name, latitude=None, longitude=None, **kwargs):
+        return Business.objects.create(
+            owner=self.owner,
+            name=name,
+            phone="08000000000",
+            address=kwargs.pop("address", "1 Main Street"),
+            established=datetime.date(2020, 1, 1),
+            latitude=latitude,
+            longitude=longitude,
+            **kwargs,
+        )
+
+    def test_geocoding_sets_location_and_cell(self):
+        business = self.create_business(
+            "Marina", address="12 Marina Road", country="NG"
+        )
+        geocode_business(business.pk)
+
+        business.refresh_from_db()
+        self.assertEqual((business.latitude, business.longitude), (6.45, 3.4))
+        self.assertEqual(business.geohash, encode_geohash(6.45, 3.4))
+
+    def test_nearby_ranks_by_distance_within_radius(self):
+        origin = (6.4500, 3.4000)
+        near = self.create_business("Near", 6.4510, 3.4010)
+        nearer = self.create_business("Nearer", 6.4501, 3.4001)
+        edge = self.create_business("Edge", 6.4500, 3.4400)
+        self.create_business("Far", 6.6000, 3.4000)
+        self.create_business("Unknown")
+
+        response = APIClient().get(
+            "/businesses/nearby", {"lat": origin[0], "lon": origin[1], "radius": 5}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [b["id"] for b in response.data], [nearer.pk, near.pk, edge.pk]
+        )
+        expected = haversine_km(*origin, [edge.latitude], [edge.longitude])[0]
+        self.assertAlmostEqual(response.data[2]["distance"], expected, places=3)
+
+    def test_update_cannot_set_location_directly(self):
+        business = self.create_business(
+            "Marina", 6.45, 3.4, address="12 Marina Road", country="NG"
+        )
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        data = {
+            "name": "Marina Two",
+            "phone": "08000000000",
+            "address": "12 Marina Road",
+            "established": "2020-01-01",
+            "latitude": 51.5,
+            "longitude": -0.12,
+            "geohash": "gcpvj",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.put(f"/businesses/{business.pk}", data, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        business.refresh_from_db()
+        self.assertEqual(business.name, "Marina Two")
+        self.assertEqual((business.latitude, business.longitude), (6.45, 3.4))
+        self.assertEqual(business.geohash, encode_geohash(6.45, 3.4))
+
+    def test_search_cells_cover_the_radius(self):
+        cells = get_search_cells(6.45, 3.40, 5)
+        for latitude, longitude in [(6.45, 3.444), (6.405, 3.40), (6.49, 3.36)]:
+            geohash = encode_geohash(latitude, longitude)
+            self.assertTrue(any(geohash.startswith(cell) for cell in cells))
+
+    def test_invalid_coordinates(self):
+        response = APIClient().get("/businesses/nearby", {"lat": 91, "lon": 0})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+    IMAGE_STORAGE_BACKEND="core.config.media.LocalImageStorage",
+    GEOCODING_BACKEND="core.config.geo.LocalGeocoder",
+    CELERY_BROKER_URL="memory://",
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class BusinessLogoTest(TestCase):
+    def test_logo_is_rendered_off_the_request(self):
+        owner = User.objects.create_user(
+            email="owner@example.com", password="pass1234", type=UserType.SHOP_OWNER
+        )
+        buffer = io.BytesIO()
+        Image.new("RGBA", (800, 800), "blue").save(buffer, "PNG")
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                "/businesses",
+                {
+                    "name": "Logo Shop",
+                    "phone": "08000000000",
+                    "address": "1 Main Street",
+                    "established": "2020-01-01",
+                    "logo": SimpleUploadedFile("logo.png", buffer.getvalue()),
+                },
+                format="multipart",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["logo_asset"]["status"], ImageStatus.PENDING)
+
+        business = Business.objects.select_related("logo_asset").get()
+        self.assertEqual(business.logo_asset.status, ImageStatus.READY)
+        self.assertTrue(business.logo_asset.renditions["thumbnail"].endswith(".png"))
+
+
+class BusinessListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="admin@example.com", password="pass1234", type=UserType.ADMIN
+        )
+        cls.owners = [
+            User.objects.create_user(
+                email=f"owner{i}@example.com",
+                password="pass1234",
+                first_name="Ada",
+                last_name=f"Owner{i}",
+                type=UserType.SHOP_OWNER,
+            )
+            for i in range(5)
+        ]
+        Business.objects.bulk_create(
+            [
+                Business(
+                    owner=owner,
+                    name=name,
+                    phone="08000000000",
+                    address="1 Main Street",
+                    established=datetime.date(2020, 1, 1),
+                )
+                for owner, name in zip(
+                    cls.owners, ["Mart", "Bakery", "Mart", "Cafe", "Mart"]
+                )
+            ]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get_ids(self, data):
+        return [business["id"] for business in data["data"]]
+
+    def test_offset_pages(self):
+        response = self.client.get("/businesses", {"page": 2, "limit": 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {"count", "total_pages", "data"})
+        self.assertEqual((response.data["count"], response.data["total_pages"]), (5, 3))
+        ordered = list(
+            Business.objects.order_by("name", "id").values_list("id", flat=True)
+        )
+        self.assertEqual(self.get_ids(response.data), ordered[2:4])
+        self.assertEqual(response.data["data"][0]["owner"], "Ada Owner0")
+
+    def test_cursor_pages(self):
+        seen = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get("/businesses", {"cursor": cursor, "limit": 2})
+            self.assertEqual(
+                set(response.data), {"count", "total_pages", "data", "next_cursor"}
+            )
+            seen += self.get_ids(response.data)
+            cursor = response.data["next_cursor"]
+
+        self.assertEqual(
+            seen,
+            list(Business.objects.order_by("name", "id").values_list("id", flat=True)),
+        )
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        for limit in [1, 5]:
+            with self.assertNumQueries(2):
+                self.client.get("/businesses", {"limit": limit})
+            with self.assertNumQueries(2):
+                self.client.get("/businesses", {"cursor": "", "limit": limit})
+
+    def test_shop_owner_sees_only_their_businesses(self):
+        self.client.force_authenticate(self.owners[1])
+        response = self.client.get("/businesses")
+        self.assertEqual([b["name"] for b in response.data["data"]], ["Bakery"])
+
+    def test_etag_depends_on_the_query_string(self):
+        first = self.client.get("/businesses", {"limit": 2})
+        second = self.client.get("/businesses", {"limit": 3})
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+        response = self.client.get(
+            "/businesses", {"limit": 2}, HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CELERY_BROKER_URL="memory://", CELERY_TASK_ALWAYS_EAGER=True)
+class BusinessAnalyticsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            email="owner@example.com", password="pass1234", type=UserType.SHOP_OWNER
+        )
+        cls.other = User.objects.create_user(
+            email="other@example.com", password="pass1234", type=UserType.SHOP_OWNER
+        )
+        cls.shop, cls.empty, cls.foreign = Business.objects.bulk_create(
+            [
+                Business(
+                    owner=owner,
+                    name=name,
+                    phone="08000000000",
+                    address="1 Main Street",
+                    established=datetime.date(2020, 1, 1),
+                )
+                for owner, name in [
+                    (cls.owner, "Shop"),
+                    (cls.owner, "Empty"),
+                    (cls.other, "Foreign"),
+                ]
+            ]
+        )
+        Product.objects.bulk_create(
+            [
+                Product(
+                    business=cls.shop,
+                    name=f"Item {i}",
+                    product_no=f"I-{i}",
+                    category=category,
+                    price=price,
+                )
+                for i, (category, price) in enumerate(
+                    [("grocery", 10), ("grocery", 20), ("books and literature", 60)]
+                )
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_analytics_are_computed_off_the_request(self):
+        with mock.patch.object(refresh_business_analytics, "delay") as delay:
+            response = self.client.get("/businesses/analytics")
+            self.client.get("/businesses/analytics")
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with()
+
+        refresh_business_analytics()
+        response = self.client.get("/businesses/analytics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["computed_at"])
+        self.assertEqual(
+            {b["id"] for b in response.data["businesses"]},
+            {self.shop.pk, self.empty.pk},
+        )
+
+    def test_aggregates_with_and_without_products(self):
+        rows = {b["id"]: b for b in compute_business_analytics()["businesses"]}
+
+        shop = rows[self.shop.pk]
+        self.assertEqual(shop["product_count"], 3)
+        self.assertEqual(
+            shop["price"], {"min": 10.0, "max": 60.0, "mean": 30.0, "median": 20.0}
+        )
+        self.assertEqual(shop["categories"], {"grocery": 2, "books and literature": 1})
+
+        empty = rows[self.empty.pk]
+        self.assertEqual(empty["product_count"], 0)
+        self.assertEqual(
+            empty["price"], {"min": None, "max": None, "mean": None, "median": None}
+        )
+        self.assertEqual(empty["categories"], {})
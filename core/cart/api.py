@@ -1,29 +1,32 @@
-import http.client
-import json
+from datetime import timedelta
 
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from coinbase_commerce.client import Client
-from coinbase_commerce.webhook import Webhook
-from decouple import config
 from drf_yasg.utils import swagger_auto_schema
-from paystackapi.charge import Charge
-from rest_framework import serializers, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from core.cart.models import Cart, CartItem, Payment
+from core.cart.models import Cart, CartItem, CheckoutCharge
 from core.cart.serializers import (
+    CartItemDeleteSerializer,
     CartListSerializer,
+    CartSnapshotSerializer,
+    CheckoutChargeSerializer,
 )
+from core.cart.payments import get_cart_idempotency_key
+from core.cart.store import flush_cart, get_cart, remove_items
+from core.cart.tasks import process_checkout_charge
+from core.config.choices import ChargeStatus
 from core.config.permissions import (
     CustomerPermission,
 )
 from core.config.schema import get_auto_schema_class_by_tags
-from core.config.serializers import IdListSerializer
-
-User = get_user_model()
 
 
 class CartViewSet(viewsets.GenericViewSet):
@@ -35,77 +38,98 @@ class CartViewSet(viewsets.GenericViewSet):
         if self.action == "list":
             return CartListSerializer
         if self.action == "delete_order":
-            return IdListSerializer
+            return CartItemDeleteSerializer
+        if self.action in ["checkout", "charge"]:
+            return CheckoutChargeSerializer
 
     @swagger_auto_schema(
         request_body=None, responses={status.HTTP_200_OK: CartListSerializer}
     )
     def list(self, request, *args, **kwargs):
-        user = get_object_or_404(User, pk=request.user.id)
-        cart = get_object_or_404(Cart, user=user)
-
-        if not request.user.is_authenticated:
-            raise serializers.ValidationError({"detail": "Not allowed"})
+        if settings.CART_STORE_ENABLED:
+            snapshot = get_cart(request.user)
+            if snapshot is None:
+                raise Http404
+            data = CartSnapshotSerializer({**snapshot, "user": request.user}).data
+            return Response(data=data, status=status.HTTP_200_OK)
+
+        items = CartItem.objects.select_related("product").order_by("id")
+        cart = get_object_or_404(
+            Cart.objects.prefetch_related(Prefetch("orders", queryset=items)),
+            user=request.user,
+        )
+        cart.user = request.user
 
         data = self.get_serializer(cart).data
         return Response(data=data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
-        request_body=IdListSerializer, responses={status.HTTP_204_NO_CONTENT: None}
+        request_body=CartItemDeleteSerializer,
+        responses={status.HTTP_204_NO_CONTENT: None},
     )
     @action(detail=False, methods=["patch"])
     def delete_order(self, request, *args, **kwargs):
-        user = get_object_or_404(User, pk=request.user.id)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        products = serializer.validated_data["products"]
+
+        if settings.CART_STORE_ENABLED:
+            remove_items(request.user, item_ids=ids, product_ids=products)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
         CartItem.objects.filter(
-            cart__user=user, pk__in=serializer.validated_data["ids"]
+            Q(pk__in=ids) | Q(product__in=products), cart__user=request.user
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
+    @swagger_auto_schema(
+        request_body=None,
+        responses={status.HTTP_202_ACCEPTED: CheckoutChargeSerializer},
+    )
     @action(detail=False, methods=["post"])
     def checkout(self, request, *args, **kwargs):
-        user = get_object_or_404(User, pk=request.user.id)
-        cart = get_object_or_404(Cart, user=user)
-        client = Client(api_key=config("COINBASE_COMMERCE_API_KEY"))
-        charge_data = {
-            "name": f"Generated charge for cart - {cart.code}",
-            "description": f"Payment for {cart.code}",
-            "local_price": {"amount": cart.total + 10, "currency": "NGN"},
-            "pricing_type": "fixed_price",
-            "metadata": {"order_id": cart.code},
-        }
-
-        try:
-            charge = client.charge.create(**charge_data)
-        except:
-            raise serializers.ValidationError({"detail": "Something went wrong"})
-
-        res = {
-            "id": charge.id,
-            "name": charge.name,
-            "amount": cart.total,
-            "rates": charge.local_exchange_rates,
-            "addresses": charge.addresses,
-            "pricing": charge.pricing,
-            "expires": charge.expires_at,
-        }
-        return Response(data=res, status=status.HTTP_200_OK)
-
-
-def handle_webhook(request):
-    payload = request.body.decode("utf-8")
-    signature = request.headers.get("X-CC-Webhook-Signature")
-    webhook_secret = config("")
-
-    try:
-        event = Webhook.construct_event(payload, signature, webhook_secret)
-    except (ValueError, Exception) as e:
-        raise serializers.ValidationError({"detail": "Something went wrong"})
-
-    if event.type == "charge:confirmed":
-        # Update the order status or send a confirmation email
-        pass
-
-    return Response(status=status.HTTP_200_OK)
+        if settings.CART_STORE_ENABLED:
+            flush_cart(request.user)
+        cart = get_object_or_404(Cart, user=request.user)
+        key = request.headers.get("Idempotency-Key") or get_cart_idempotency_key(cart)
+
+        with transaction.atomic():
+            charge, created = CheckoutCharge.objects.get_or_create(
+                cart=cart, idempotency_key=key[:64], defaults={"amount": cart.total}
+            )
+            # A failed attempt may be retried with the same key, and so may one
+            # whose worker died or whose message was lost; the provider sees
+            # the same Idempotency-Key. Anything else returns the charge that
+            # already exists.
+            stale = timezone.now() - timedelta(seconds=settings.CHECKOUT_CHARGE_TIMEOUT)
+            retry = (
+                CheckoutCharge.objects.filter(pk=charge.pk)
+                .filter(
+                    Q(status=ChargeStatus.FAILED)
+                    | Q(
+                        status__in=[ChargeStatus.PENDING, ChargeStatus.PROCESSING],
+                        updated_at__lt=stale,
+                    )
+                )
+                .update(
+                    status=ChargeStatus.PENDING, error="", updated_at=timezone.now()
+                )
+            )
+            if created or retry:
+                transaction.on_commit(lambda: process_checkout_charge.delay(charge.pk))
+
+        charge.refresh_from_db()
+        data = CheckoutChargeSerializer(charge).data
+        return Response(data=data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        request_body=None, responses={status.HTTP_200_OK: CheckoutChargeSerializer}
+    )
+    @action(detail=False, methods=["get"], url_path=r"charges/(?P<charge_pk>[\d]+)")
+    def charge(self, request, *args, **kwargs):
+        charge = get_object_or_404(
+            CheckoutCharge, pk=self.kwargs["charge_pk"], cart__user=request.user
+        )
+        data = CheckoutChargeSerializer(charge).data
+        return Response(data=data, status=status.HTTP_200_OK)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CartConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core.cart"
+
+    def ready(self):
+        from core.cart import signals  # noqa: F401
@@ -0,0 +1,124 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.cart.models import (
+    ArchivedCart,
+    ArchivedCartItem,
+    Cart,
+    CartItem,
+    CheckoutCharge,
+    Payment,
+)
+from core.cart.store import evict_cart, get_cart_dirty_key
+from core.config.choices import CartStatus, ChargeStatus
+
+# Copies a batch of carts and their items to the archive tables and removes
+# them from the hot ones in a single statement.
+MOVE_SQL = """
+    WITH moved_carts AS (
+        INSERT INTO {archived_cart} (
+            cart_id, user_id, code, total, status, created_at, updated_at,
+            archived_at
+        )
+        SELECT id, user_id, code, total, %(status)s, created_at, updated_at, now()
+        FROM {cart} WHERE id = ANY(%(ids)s)
+        RETURNING id, cart_id
+    ), moved_items AS (
+        INSERT INTO {archived_item} (
+            cart_id, product_id, quantity, created_at, updated_at
+        )
+        SELECT moved_carts.id, item.product_id, item.quantity, item.created_at,
+            item.updated_at
+        FROM {item} AS item JOIN moved_carts ON moved_carts.cart_id = item.cart_id
+        RETURNING id
+    ), deleted_charges AS (
+        DELETE FROM {charge} WHERE cart_id = ANY(%(ids)s)
+    ), deleted_items AS (
+        DELETE FROM {item} WHERE cart_id = ANY(%(ids)s)
+    ), deleted_carts AS (
+        DELETE FROM {cart} WHERE id = ANY(%(ids)s)
+    )
+    SELECT (SELECT count(*) FROM moved_carts), (SELECT count(*) FROM moved_items)
+""".format(
+    archived_cart=ArchivedCart._meta.db_table,
+    archived_item=ArchivedCartItem._meta.db_table,
+    cart=Cart._meta.db_table,
+    item=CartItem._meta.db_table,
+    charge=CheckoutCharge._meta.db_table,
+)
+
+
+def get_stale_carts(cutoff):
+    recent_items = CartItem.objects.filter(cart=OuterRef("pk"), updated_at__gte=cutoff)
+    payments = Payment.objects.filter(cart=OuterRef("pk"))
+    open_charges = CheckoutCharge.objects.filter(cart=OuterRef("pk")).exclude(
+        status=ChargeStatus.FAILED
+    )
+    return (
+        Cart.objects.filter(updated_at__lt=cutoff, payment__isnull=True)
+        .exclude(status=CartStatus.PAID)
+        .exclude(Exists(recent_items))
+        .exclude(Exists(payments))
+        .exclude(Exists(open_charges))
+    )
+
+
+@transaction.atomic
+def archive_batch(cutoff, batch_size, after_id=0):
+    # Returns the last id looked at, so the next batch starts past the carts
+    # this one had to skip instead of selecting them again.
+    rows = list(
+        get_stale_carts(cutoff)
+        .filter(id__gt=after_id)
+        .select_for_update(skip_locked=True)
+        .order_by("id")
+        .values_list("id", "user_id")[:batch_size]
+    )
+    if not rows:
+        return after_id, 0, 0, 0
+    last_id, claimed = rows[-1][0], len(rows)
+
+    # A cart with unflushed writes in the cart store is not idle.
+    dirty = cache.get_many([get_cart_dirty_key(user_id) for _, user_id in rows])
+    rows = [row for row in rows if get_cart_dirty_key(row[1]) not in dirty]
+    if not rows:
+        return last_id, claimed, 0, 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            MOVE_SQL, {"ids": [pk for pk, _ in rows], "status": CartStatus.ARCHIVED}
+        )
+        carts, items = cursor.fetchone()
+
+    user_ids = [user_id for _, user_id in rows]
+    transaction.on_commit(lambda: [evict_cart(user_id) for user_id in user_ids])
+    return last_id, claimed, carts, items
+
+
+def archive_stale_carts(idle_days=None, batch_size=None, max_batches=None):
+    if idle_days is None:
+        idle_days = settings.CART_ARCHIVE_IDLE_DAYS
+    if batch_size is None:
+        batch_size = settings.CART_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=idle_days)
+
+    started = time.monotonic()
+    metrics = {"batches": 0, "carts": 0, "items": 0}
+    after_id = 0
+    while max_batches is None or metrics["batches"] < max_batches:
+        after_id, claimed, carts, items = archive_batch(cutoff, batch_size, after_id)
+        if not claimed:
+            break
+        metrics["batches"] += 1
+        metrics["carts"] += carts
+        metrics["items"] += items
+        if claimed < batch_size:
+            break
+    metrics["seconds"] = round(time.monotonic() - started, 3)
+    return metrics
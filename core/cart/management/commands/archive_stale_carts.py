@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.cart.archive import archive_stale_carts
+
+
+class Command(BaseCommand):
+    help = "Move carts idle past the threshold to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--idle-days", type=int, default=settings.CART_ARCHIVE_IDLE_DAYS
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.CART_ARCHIVE_BATCH_SIZE
+        )
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        metrics = archive_stale_carts(
+            idle_days=options["idle_days"],
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {metrics['carts']} carts and {metrics['items']} items "
+                f"in {metrics['batches']} batches ({metrics['seconds']}s)"
+            )
+        )
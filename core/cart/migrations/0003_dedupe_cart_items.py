@@ -0,0 +1,34 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_recompute_cart_totals"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            DELETE FROM cart_cartitem AS duplicate
+            USING cart_cartitem AS kept
+            WHERE duplicate.cart_id = kept.cart_id
+                AND duplicate.product_id = kept.product_id
+                AND duplicate.id < kept.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE cart_cart SET total = COALESCE((
+                SELECT sum(product_product.price * cart_cartitem.quantity)::integer
+                FROM cart_cartitem
+                JOIN product_product ON product_product.id = cart_cartitem.product_id
+                WHERE cart_cartitem.cart_id = cart_cart.id
+            ), 0)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0004_cartitem_cart_item_unique_product"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CheckoutCharge",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("idempotency_key", models.CharField(max_length=64)),
+                ("provider", models.CharField(default="coinbase", max_length=255)),
+                ("amount", models.IntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("created", "Created"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=12,
+                    ),
+                ),
+                ("provider_charge_id", models.CharField(blank=True, max_length=255)),
+                ("details", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "cart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="charges",
+                        to="cart.cart",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="checkoutcharge",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "idempotency_key"), name="checkout_charge_unique_key"
+            ),
+        ),
+    ]
@@ -1,9 +1,16 @@
 from django.conf import settings
 
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
 
 from core.product.models import Product
-from core.config.choices import CartStatus
+from core.config.choices import (
+    CartStatus,
+    ChargeStatus,
+    WebhookEventStatus,
+    WebhookProvider,
+)
 
 
 class Payment(models.Model):
@@ -17,6 +24,19 @@ class Payment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class CartQuerySet(models.QuerySet):
+    def refresh_totals(self):
+        totals = (
+            CartItem.objects.filter(cart=OuterRef("pk"))
+            .values("cart")
+            .annotate(total=Sum(F("product__price") * F("quantity")))
+            .values("total")
+        )
+        return self.update(
+            total=Coalesce(Cast(Subquery(totals), models.IntegerField()), 0)
+        )
+
+
 class Cart(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart"
@@ -30,10 +50,26 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.code
 
 
+class CartItemQuerySet(models.QuerySet):
+    def upsert(self, cart, quantities):
+        items = [
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        ]
+        return self.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=["cart_id", "product_id"],
+            update_fields=["quantity", "updated_at"],
+        )
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="orders")
     product = models.ForeignKey(
@@ -43,8 +79,102 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="cart_item_unique_product"
+            )
+        ]
+
     def __str__(self) -> str:
         return f"{self.product} - {self.quantity}"
 
     def calculate_item_price(self):
         return self.product.price * self.quantity
+
+
+class CheckoutCharge(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="charges")
+    idempotency_key = models.CharField(max_length=64)
+    provider = models.CharField(max_length=255, default="coinbase")
+    amount = models.IntegerField()
+    status = models.CharField(
+        max_length=12, choices=ChargeStatus.choices, default=ChargeStatus.PENDING
+    )
+    provider_charge_id = models.CharField(max_length=255, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "idempotency_key"], name="checkout_charge_unique_key"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.cart} - {self.status}"
+
+
+class WebhookEvent(models.Model):
+    provider = models.CharField(max_length=12, choices=WebhookProvider.choices)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=12,
+        choices=WebhookEventStatus.choices,
+        default=WebhookEventStatus.PENDING,
+    )
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "event_id"], name="webhook_event_unique_id"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"], name="webhook_event_status_idx")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.provider} - {self.event_type}"
+
+
+class ArchivedCart(models.Model):
+    cart_id = models.BigIntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_carts",
+    )
+    code = models.CharField(max_length=15)
+    total = models.IntegerField(default=0)
+    status = models.CharField(
+        max_length=10, choices=CartStatus.choices, default=CartStatus.ARCHIVED
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.code
+
+
+class ArchivedCartItem(models.Model):
+    cart = models.ForeignKey(
+        ArchivedCart, on_delete=models.CASCADE, related_name="orders"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    quantity = models.IntegerField(default=1)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
@@ -0,0 +1,195 @@
+import hashlib
+import hmac
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.cart.models import Cart, CheckoutCharge, Payment, WebhookEvent
+from core.config.choices import (
+    CartStatus,
+    ChargeStatus,
+    WebhookEventStatus,
+    WebhookProvider,
+)
+
+COINBASE_API_VERSION = "2018-03-22"
+CHECKOUT_FEE = 10
+PAYMENT_CURRENCY = "NGN"
+WEBHOOK_SIGNATURES = {
+    WebhookProvider.COINBASE: ("COINBASE_COMMERCE_WEBHOOK_SECRET", hashlib.sha256),
+    WebhookProvider.PAYSTACK: ("PAYSTACK_SECRET_KEY", hashlib.sha512),
+}
+PAID_EVENTS = {
+    WebhookProvider.COINBASE: {"charge:confirmed", "charge:resolved"},
+    WebhookProvider.PAYSTACK: {"charge.success"},
+}
+
+
+@lru_cache(maxsize=None)
+def get_session():
+    # One pooled session per worker process. Only connection failures are
+    # retried: the request never reached the provider, so it is safe to resend.
+    session = requests.Session()
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.PAYMENT_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_timeout():
+    return settings.PAYMENT_CONNECT_TIMEOUT, settings.PAYMENT_READ_TIMEOUT
+
+
+def get_cart_idempotency_key(cart):
+    items = sorted(cart.orders.values_list("product_id", "quantity"))
+    raw = f"{cart.pk}:{cart.total}:{items}".encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def create_coinbase_charge(charge):
+    cart = charge.cart
+    data = {
+        "name": f"Generated charge for cart - {cart.code}",
+        "description": f"Payment for {cart.code}",
+        "local_price": {
+            "amount": charge.amount + CHECKOUT_FEE,
+            "currency": PAYMENT_CURRENCY,
+        },
+        "pricing_type": "fixed_price",
+        "metadata": {"order_id": cart.code, "charge_id": charge.pk},
+    }
+    response = get_session().post(
+        f"{settings.COINBASE_COMMERCE_API_URL}/charges",
+        json=data,
+        headers={
+            "X-CC-Api-Key": settings.COINBASE_COMMERCE_API_KEY,
+            "X-CC-Version": COINBASE_API_VERSION,
+            "Idempotency-Key": charge.idempotency_key,
+        },
+        timeout=get_timeout(),
+    )
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+def verify_webhook_signature(provider, body, signature):
+    setting, digest = WEBHOOK_SIGNATURES[provider]
+    secret = getattr(settings, setting)
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, digest).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_webhook_event(provider, payload):
+    if provider == WebhookProvider.COINBASE:
+        return payload["event"]["id"], payload["event"]["type"]
+    # Paystack sends no event id; a retry repeats the same event and object.
+    return f"{payload['event']}:{payload['data']['id']}", payload["event"]
+
+
+def read_payment(event):
+    # Returns (cart code, amount paid, currency, provider charge id). The
+    # payer controls the cart code, so the amount is what proves the payment.
+    if event.provider == WebhookProvider.COINBASE:
+        data = event.payload["event"]["data"]
+        price = data["pricing"]["local"]
+        return (
+            data["metadata"]["order_id"],
+            Decimal(price["amount"]),
+            price["currency"],
+            data["id"],
+        )
+
+    data = event.payload["data"]
+    metadata = data.get("metadata") or {}
+    code = metadata.get("order_id") or data["reference"]
+    return code, Decimal(data["amount"]) / 100, data["currency"], ""
+
+
+def get_amount_owed(cart, charge=None):
+    return (cart.total if charge is None else charge.amount) + CHECKOUT_FEE
+
+
+def apply_webhook_events(events):
+    now = timezone.now()
+    payments = {}
+    for event in events:
+        event.status = WebhookEventStatus.PROCESSED
+        event.processed_at = now
+        if event.event_type not in PAID_EVENTS[event.provider]:
+            continue
+        try:
+            payments[event.pk] = read_payment(event)
+        except (KeyError, TypeError, InvalidOperation) as e:
+            event.status = WebhookEventStatus.FAILED
+            event.error = f"Malformed payload: {e!r}"
+
+    codes = [code for code, _, _, _ in payments.values()]
+    carts = {
+        cart.code: cart
+        for cart in Cart.objects.select_for_update().filter(code__in=codes)
+    }
+    charge_ids = [charge_id for _, _, _, charge_id in payments.values() if charge_id]
+    charges = {
+        charge.provider_charge_id: charge
+        for charge in CheckoutCharge.objects.filter(provider_charge_id__in=charge_ids)
+    }
+    confirmed = []
+    paid = []
+    new_payments = []
+    for event in events:
+        if event.pk not in payments:
+            continue
+        code, amount, currency, charge_id = payments[event.pk]
+        cart = carts.get(code)
+        if cart is None:
+            event.status = WebhookEventStatus.FAILED
+            event.error = f"Unknown cart {code}"
+            continue
+        charge = charges.get(charge_id)
+        if charge is not None and charge.cart_id != cart.pk:
+            event.status = WebhookEventStatus.FAILED
+            event.error = f"Charge {charge_id} does not belong to cart {code}"
+            continue
+        owed = get_amount_owed(cart, charge)
+        if amount != owed or currency != PAYMENT_CURRENCY:
+            event.status = WebhookEventStatus.FAILED
+            event.error = f"Paid {amount} {currency}, owed {owed} {PAYMENT_CURRENCY}"
+            continue
+        # Providers send several success events per payment; the first wins.
+        if cart.status == CartStatus.PAID or cart.payment_id:
+            continue
+
+        cart.status = CartStatus.PAID
+        cart.updated_at = now
+        paid.append(cart)
+        if charge is not None:
+            confirmed.append(charge.pk)
+        new_payments.append(
+            Payment(
+                cart=cart,
+                amount=owed,
+                provider=event.provider,
+                notes=f"Webhook event {event.event_id}",
+            )
+        )
+
+    for cart, payment in zip(paid, Payment.objects.bulk_create(new_payments)):
+        cart.payment = payment
+    Cart.objects.bulk_update(paid, ["status", "payment", "updated_at"])
+
+    CheckoutCharge.objects.filter(pk__in=confirmed).update(
+        status=ChargeStatus.CONFIRMED, updated_at=now
+    )
+    WebhookEvent.objects.bulk_update(events, ["status", "error", "processed_at"])
@@ -1,19 +1,17 @@
-from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from rest_framework import serializers
 
 from core.accounts.serializers import UserDetailsSerializer
-from core.cart.models import Cart, CartItem
+from core.cart.models import Cart, CartItem, CheckoutCharge
+from core.cart.store import ITEM_FIELDS, add_items, get_subtotal
 from core.config.choices import UserType
 from core.config.utils import generate_code
 from core.product.models import Product
 
 
-User = get_user_model()
-
-
 class CartItemBasicSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source="product.name")
     product_no = serializers.CharField(source="product.product_no")
@@ -48,17 +46,63 @@ class CartListSerializer(serializers.Serializer):
     created_at = serializers.DateTimeField()
 
     def get_items(self, obj):
-        user = obj.user
-        items = CartItem.objects.filter(cart__user=user)
-        data = CartItemBasicSerializer(items, many=True).data
+        data = CartItemBasicSerializer(obj.orders.all(), many=True).data
         return data
 
     def get_subtotal(self, obj):
-        obj.total = sum([ordx.calculate_item_price() for ordx in obj.orders.all()])
-        obj.save(update_fields=["total"])
         return obj.total
 
 
+class CartSnapshotItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(allow_null=True)
+    product = serializers.IntegerField()
+    name = serializers.CharField()
+    product_no = serializers.CharField()
+    category = serializers.CharField()
+    description = serializers.CharField()
+    quantity = serializers.IntegerField()
+    price = serializers.FloatField()
+    total = serializers.SerializerMethodField()
+
+    def get_total(self, obj):
+        return obj["price"] * obj["quantity"]
+
+
+class CartSnapshotSerializer(serializers.Serializer):
+    user = UserDetailsSerializer()
+    code = serializers.CharField()
+    items = serializers.SerializerMethodField()
+    subtotal = serializers.SerializerMethodField()
+    created_at = serializers.DateTimeField()
+
+    def get_items(self, obj):
+        return CartSnapshotItemSerializer(obj["items"].values(), many=True).data
+
+    def get_subtotal(self, obj):
+        return get_subtotal(obj)
+
+
+class CartItemDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), default=list)
+    products = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
+class CheckoutChargeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CheckoutCharge
+        fields = [
+            "id",
+            "status",
+            "amount",
+            "provider",
+            "provider_charge_id",
+            "details",
+            "error",
+            "created_at",
+            "updated_at",
+        ]
+
+
 class CartItemListSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
@@ -85,18 +129,21 @@ class CartItemCreateUpdateSerializer(serializers.Serializer):
         if not user.type == UserType.CUSTOMER:
             raise serializers.ValidationError({"detail": "Not Allowed"})
 
-        user = get_object_or_404(User, pk=user.id)
+        quantities = {
+            item["product"]: item["quantity"] for item in self.validated_data["items"]
+        }
+        products = list(
+            Product.objects.filter(pk__in=quantities).values("id", *ITEM_FIELDS)
+        )
+        if len(products) != len(quantities):
+            raise Http404
+
+        if settings.CART_STORE_ENABLED:
+            return add_items(user, products, quantities)
+
         cart, created = Cart.objects.get_or_create(
             user=user, defaults={"user": user, "code": generate_code()}
         )
-
-        for ordx in self.validated_data["items"]:
-            qty = ordx.pop("quantity")
-            product = get_object_or_404(Product, pk=ordx["product"])
-            order, created = CartItem.objects.update_or_create(
-                product=product, defaults={"product": product}
-            )
-            order.cart = cart
-            order.quantity = qty
-            order.save(update_fields=["cart", "quantity"])
+        CartItem.objects.upsert(cart, quantities)
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
         return cart
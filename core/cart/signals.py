@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cart.models import Cart, CartItem
+from core.product.models import Product
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    Cart.objects.filter(pk=instance.cart_id).refresh_totals()
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and "price" not in update_fields):
+        return
+    Cart.objects.filter(orders__product=instance).refresh_totals()
@@ -0,0 +1,278 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cart.models import Cart, CartItem
+from core.config.utils import generate_code
+
+CART_LOCK_TIMEOUT = 5
+CART_FLUSH_BATCH_SIZE = 500
+CART_DIRTY_KEY = "cart:dirty"
+CART_DIRTY_LOCK_KEY = "cart:dirty:lock"
+CART_DIRTY_SWEEP_KEY = "cart:dirty:sweep"
+CART_DIRTY_SWEEP_INTERVAL = 60 * 10
+ITEM_FIELDS = ["name", "product_no", "category", "description", "price"]
+
+
+def get_cart_key(user_id):
+    return f"cart:{user_id}"
+
+
+def get_cart_dirty_key(user_id):
+    return f"cart:{user_id}:dirty"
+
+
+def get_cart_lock_key(user_id):
+    return f"cart:{user_id}:lock"
+
+
+@contextmanager
+def cache_lock(key, timeout=CART_LOCK_TIMEOUT):
+    # A holder that dies leaves the key behind until it expires, so waiting
+    # never takes longer than `timeout`.
+    while not cache.add(key, 1, timeout):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def get_item_snapshot(item_id, product, quantity):
+    snapshot = {field: product[field] for field in ITEM_FIELDS}
+    snapshot.update(id=item_id, product=product["id"], quantity=quantity)
+    return snapshot
+
+
+def load_cart(user_id):
+    cart = Cart.objects.filter(user_id=user_id).first()
+    if cart is None:
+        return None
+
+    items = (
+        CartItem.objects.filter(cart=cart)
+        .order_by("id")
+        .values("id", "product_id", "quantity", *[f"product__{f}" for f in ITEM_FIELDS])
+    )
+    return {
+        "cart_id": cart.pk,
+        "code": cart.code,
+        "created_at": cart.created_at,
+        "items": {
+            item["product_id"]: get_item_snapshot(
+                item["id"],
+                {
+                    "id": item["product_id"],
+                    **{f: item[f"product__{f}"] for f in ITEM_FIELDS},
+                },
+                item["quantity"],
+            )
+            for item in items
+        },
+    }
+
+
+def get_cart(user):
+    key = get_cart_key(user.pk)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = load_cart(user.pk)
+        if snapshot is not None:
+            cache.add(key, snapshot, settings.CART_STORE_TIMEOUT)
+    return snapshot
+
+
+def get_subtotal(snapshot):
+    # Prices are snapshots taken when the item was added; the total charged at
+    # checkout is recomputed from current prices when the cart is flushed.
+    return round(sum(i["price"] * i["quantity"] for i in snapshot["items"].values()))
+
+
+def get_redis_client():
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+def mark_dirty(user_id):
+    # The flag lives as long as the snapshot and the user is queued on every
+    # write, so a lost queue entry is restored by the next change to the cart.
+    cache.set(get_cart_dirty_key(user_id), 1, settings.CART_STORE_TIMEOUT)
+    client = get_redis_client()
+    if client is not None:
+        client.sadd(cache.make_key(CART_DIRTY_KEY), user_id)
+        return
+
+    with cache_lock(CART_DIRTY_LOCK_KEY):
+        dirty = cache.get(CART_DIRTY_KEY, set())
+        if user_id not in dirty:
+            dirty.add(user_id)
+            cache.set(CART_DIRTY_KEY, dirty, None)
+
+
+def pop_dirty(limit):
+    client = get_redis_client()
+    if client is not None:
+        user_ids = client.spop(cache.make_key(CART_DIRTY_KEY), limit) or []
+        return {int(uid) for uid in user_ids}
+
+    with cache_lock(CART_DIRTY_LOCK_KEY):
+        dirty = cache.get(CART_DIRTY_KEY, set())
+        user_ids = set(list(dirty)[:limit])
+        cache.set(CART_DIRTY_KEY, dirty - user_ids, None)
+    return user_ids
+
+
+def requeue_dirty():
+    # The flags are the source of truth: queue every flagged cart again, in
+    # case a worker died after popping it or the queue itself was evicted.
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    prefix, suffix = cache.make_key(get_cart_dirty_key("*")).split("*")
+    user_ids = [
+        key.decode()[len(prefix) : -len(suffix)]
+        for key in client.scan_iter(match=f"{prefix}*{suffix}", count=1000)
+    ]
+    user_ids = [uid for uid in user_ids if uid.isdigit()]
+    if user_ids:
+        client.sadd(cache.make_key(CART_DIRTY_KEY), *user_ids)
+    return len(user_ids)
+
+
+@contextmanager
+def update_cart(user):
+    with cache_lock(get_cart_lock_key(user.pk)):
+        snapshot = get_cart(user) or {
+            "cart_id": None,
+            "code": generate_code(),
+            "created_at": timezone.now(),
+            "items": {},
+        }
+        yield snapshot
+        cache.set(get_cart_key(user.pk), snapshot, settings.CART_STORE_TIMEOUT)
+    mark_dirty(user.pk)
+
+
+def add_items(user, products, quantities):
+    with update_cart(user) as snapshot:
+        for product in products:
+            item = snapshot["items"].get(product["id"])
+            snapshot["items"][product["id"]] = get_item_snapshot(
+                item["id"] if item else None, product, quantities[product["id"]]
+            )
+    return snapshot
+
+
+def remove_items(user, item_ids=(), product_ids=()):
+    with update_cart(user) as snapshot:
+        snapshot["items"] = {
+            product_id: item
+            for product_id, item in snapshot["items"].items()
+            if product_id not in product_ids
+            and (item["id"] is None or item["id"] not in item_ids)
+        }
+    return snapshot
+
+
+def evict_cart(user_id):
+    cache.delete_many([get_cart_key(user_id), get_cart_dirty_key(user_id)])
+
+
+@transaction.atomic
+def write_carts(snapshots):
+    carts = {c.user_id: c for c in Cart.objects.filter(user_id__in=snapshots)}
+    missing = [
+        Cart(user_id=user_id, code=snapshot["code"])
+        for user_id, snapshot in snapshots.items()
+        if user_id not in carts
+    ]
+    if missing:
+        Cart.objects.bulk_create(missing, ignore_conflicts=True)
+        carts = {c.user_id: c for c in Cart.objects.filter(user_id__in=snapshots)}
+
+    removed = Q()
+    for user_id, snapshot in snapshots.items():
+        removed |= Q(cart=carts[user_id]) & ~Q(product_id__in=snapshot["items"])
+    CartItem.objects.filter(removed).delete()
+
+    CartItem.objects.bulk_create(
+        [
+            CartItem(
+                cart=carts[user_id],
+                product_id=product_id,
+                quantity=item["quantity"],
+            )
+            for user_id, snapshot in snapshots.items()
+            for product_id, item in snapshot["items"].items()
+        ],
+        update_conflicts=True,
+        unique_fields=["cart_id", "product_id"],
+        update_fields=["quantity", "updated_at"],
+    )
+    Cart.objects.filter(pk__in=[c.pk for c in carts.values()]).refresh_totals()
+
+    item_ids = {}
+    for user_id, product_id, item_id in CartItem.objects.filter(
+        cart__in=carts.values()
+    ).values_list("cart__user_id", "product_id", "id"):
+        item_ids[user_id, product_id] = item_id
+    return carts, item_ids
+
+
+def record_flush(user_id, cart, item_ids):
+    with cache_lock(get_cart_lock_key(user_id)):
+        snapshot = cache.get(get_cart_key(user_id))
+        if snapshot is None:
+            return
+        snapshot["cart_id"] = cart.pk
+        for product_id, item in snapshot["items"].items():
+            item["id"] = item_ids.get((user_id, product_id), item["id"])
+        cache.set(get_cart_key(user_id), snapshot, settings.CART_STORE_TIMEOUT)
+
+
+def flush_carts(user_ids):
+    # Clearing the dirty flag before reading means a write that lands while we
+    # flush marks the cart dirty again instead of being lost.
+    user_ids = [uid for uid in user_ids if cache.delete(get_cart_dirty_key(uid))]
+    snapshots = cache.get_many([get_cart_key(uid) for uid in user_ids])
+    snapshots = {
+        uid: snapshots[get_cart_key(uid)]
+        for uid in user_ids
+        if get_cart_key(uid) in snapshots
+    }
+    if not snapshots:
+        return 0
+
+    try:
+        carts, item_ids = write_carts(snapshots)
+    except Exception:
+        for user_id in snapshots:
+            mark_dirty(user_id)
+        raise
+
+    for user_id, cart in carts.items():
+        record_flush(user_id, cart, item_ids)
+    return len(snapshots)
+
+
+def flush_cart(user):
+    return flush_carts([user.pk])
+
+
+def flush_dirty_carts(batch_size=CART_FLUSH_BATCH_SIZE):
+    if cache.add(CART_DIRTY_SWEEP_KEY, 1, CART_DIRTY_SWEEP_INTERVAL):
+        requeue_dirty()
+    flushed = 0
+    while True:
+        user_ids = pop_dirty(batch_size)
+        if not user_ids:
+            return flushed
+        flushed += flush_carts(user_ids)
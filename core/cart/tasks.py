@@ -0,0 +1,73 @@
+import requests
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+
+from core.cart import store
+from core.cart.archive import archive_stale_carts as archive
+from core.cart.models import CheckoutCharge, WebhookEvent
+from core.cart.payments import apply_webhook_events, create_coinbase_charge
+from core.config.choices import ChargeStatus, WebhookEventStatus
+
+WEBHOOK_BATCH_SIZE = 200
+
+
+@shared_task
+def flush_dirty_carts():
+    return store.flush_dirty_carts()
+
+
+@shared_task
+def process_checkout_charge(charge_id):
+    charge = CheckoutCharge.objects.select_related("cart").get(pk=charge_id)
+    charges = CheckoutCharge.objects.filter(pk=charge.pk)
+
+    # Only one worker may talk to the provider for a given charge.
+    if not charges.filter(status=ChargeStatus.PENDING).update(
+        status=ChargeStatus.PROCESSING, updated_at=timezone.now()
+    ):
+        return
+
+    try:
+        data = create_coinbase_charge(charge)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        charges.update(
+            status=ChargeStatus.FAILED, error=str(e), updated_at=timezone.now()
+        )
+        return
+
+    charges.update(
+        status=ChargeStatus.CREATED,
+        provider_charge_id=data["id"],
+        details={
+            "name": data.get("name"),
+            "hosted_url": data.get("hosted_url"),
+            "rates": data.get("local_exchange_rates"),
+            "addresses": data.get("addresses"),
+            "pricing": data.get("pricing"),
+            "expires": data.get("expires_at"),
+        },
+        error="",
+        updated_at=timezone.now(),
+    )
+
+
+@shared_task
+def process_webhook_events(batch_size=WEBHOOK_BATCH_SIZE):
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=WebhookEventStatus.PENDING)
+                .order_by("id")[:batch_size]
+            )
+            if not events:
+                return processed
+            apply_webhook_events(events)
+        processed += len(events)
+
+
+@shared_task
+def archive_stale_carts():
+    return archive()
@@ -1,3 +1,535 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from core.accounts.models import User
+from core.cart.archive import archive_stale_carts
+from core.cart.models import (
+    ArchivedCart,
+    ArchivedCartItem,
+    Cart,
+    CartItem,
+    CheckoutCharge,
+    Payment,
+    WebhookEvent,
+)
+from core.cart.store import get_cart_dirty_key, get_cart_key, pop_dirty
+from core.cart.tasks import flush_dirty_carts
+from core.config.choices import (
+    CartStatus,
+    ChargeStatus,
+    UserType,
+    WebhookEventStatus,
+)
+from core.product.tests import create_business, create_products
+
+
+@override_settings(CART_STORE_ENABLED=False)
+class CartTotalTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.products = create_products(cls.business, 3, images_per_product=0)
+        cls.customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def add_to_cart(self, *items):
+        data = {"items": [{"product": p.pk, "quantity": q} for p, q in items]}
+        response = self.client.post("/products/add_to_cart", data, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Cart.objects.get(user=self.customer)
+
+    def test_total_follows_cart_item_changes(self):
+        first, second, _ = self.products
+        cart = self.add_to_cart((first, 2), (second, 1))
+        self.assertEqual(cart.total, 100 * 2 + 101)
+
+        item = CartItem.objects.get(cart=cart, product=first)
+        response = self.client.patch(
+            "/cart/delete_order", {"ids": [item.pk]}, format="json"
+        )
+        self.assertEqual(response.status_code, 204)
+        cart.refresh_from_db()
+        self.assertEqual(cart.total, 101)
+
+    def test_total_follows_price_changes(self):
+        product = self.products[2]
+        cart = self.add_to_cart((product, 3))
+
+        product.price = 50
+        product.save()
+        cart.refresh_from_db()
+        self.assertEqual(cart.total, 150)
+
+    def test_list_is_a_pure_read(self):
+        self.add_to_cart((self.products[0], 1), (self.products[1], 1))
+        Cart.objects.update(total=7)
+
+        response = self.client.get("/cart")
+        self.assertEqual(response.data["subtotal"], 7)
+        self.assertEqual(Cart.objects.get().total, 7)
+        self.assertEqual(len(response.data["items"]), 2)
+
+
+@override_settings(CART_STORE_ENABLED=False)
+class AddToCartTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(create_business(), 30, images_per_product=0)
+        cls.customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def post(self, items):
+        data = {"items": [{"product": p.pk, "quantity": q} for p, q in items]}
+        return self.client.post("/products/add_to_cart", data, format="json")
+
+    def test_query_count_does_not_grow_with_items(self):
+        self.post([(self.products[0], 1)])
+        with self.assertNumQueries(6):
+            response = self.post([(product, 2) for product in self.products])
+        self.assertEqual(response.status_code, 201)
+
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual(cart.orders.count(), 30)
+        self.assertEqual(set(cart.orders.values_list("quantity", flat=True)), {2})
+        self.assertEqual(cart.total, sum(p.price * 2 for p in self.products))
+
+    def test_unknown_product_is_rejected(self):
+        self.post([(self.products[0], 1)])
+        data = {"items": [{"product": 0, "quantity": 1}]}
+        response = self.client.post("/products/add_to_cart", data, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+
+@override_settings(CART_STORE_ENABLED=True)
+class CartStoreTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(create_business(), 3, images_per_product=0)
+        cls.customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def post(self, items):
+        data = {"items": [{"product": p.pk, "quantity": q} for p, q in items]}
+        response = self.client.post("/products/add_to_cart", data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_active_cart_is_served_from_the_cache(self):
+        first, second, third = self.products
+        self.post([(first, 1), (second, 2)])
+        with self.assertNumQueries(0):
+            response = self.client.get("/cart")
+            self.client.patch(
+                "/cart/delete_order", {"products": [first.pk]}, format="json"
+            )
+        self.assertEqual(response.data["subtotal"], 100 + 101 * 2)
+        self.assertFalse(Cart.objects.exists())
+
+        self.post([(third, 1)])
+        self.assertEqual(flush_dirty_carts(), 1)
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual(cart.total, 101 * 2 + 102)
+        self.assertEqual(
+            set(cart.orders.values_list("product", "quantity")),
+            {(second.pk, 2), (third.pk, 1)},
+        )
+
+        response = self.client.get("/cart")
+        item_ids = {item["product"]: item["id"] for item in response.data["items"]}
+        self.assertEqual(item_ids, dict(cart.orders.values_list("product", "id")))
+        self.assertEqual(flush_dirty_carts(), 0)
+
+    def test_cart_is_loaded_from_the_database_on_a_miss(self):
+        cart = Cart.objects.create(user=self.customer, code="c0de")
+        CartItem.objects.upsert(cart, {self.products[0].pk: 4})
+
+        response = self.client.get("/cart")
+        self.assertEqual(response.data["code"], "c0de")
+        self.assertEqual(response.data["subtotal"], 400)
+
+        item = CartItem.objects.get()
+        self.client.patch("/cart/delete_order", {"ids": [item.pk]}, format="json")
+        flush_dirty_carts()
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Cart.objects.get().total, 0)
+
+    def test_lost_queue_entry_is_restored_by_the_next_write(self):
+        first, second, _ = self.products
+        self.post([(first, 1)])
+        # A worker that dies after popping the cart leaves only the flag.
+        self.assertEqual(pop_dirty(10), {self.customer.pk})
+        self.assertEqual(flush_dirty_carts(), 0)
+
+        self.post([(second, 1)])
+        self.assertEqual(flush_dirty_carts(), 1)
+        self.assertEqual(
+            set(CartItem.objects.values_list("product", flat=True)),
+            {first.pk, second.pk},
+        )
+
+
+class CartReadQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(create_business(), 200, images_per_product=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_cart(self, size):
+        customer = User.objects.create_user(
+            email=f"customer{size}@example.com",
+            password="pass1234",
+            type=UserType.CUSTOMER,
+        )
+        cart = Cart.objects.create(user=customer, code=f"cart-{size}")
+        CartItem.objects.upsert(cart, {p.pk: 1 for p in self.products[:size]})
+        return customer
+
+    def assert_flat_read(self, queries):
+        for size in [1, 50, 200]:
+            customer = self.create_cart(size)
+            self.client.force_authenticate(customer)
+            with self.subTest(size=size), self.assertNumQueries(queries):
+                response = self.client.get("/cart")
+            self.assertEqual(len(response.data["items"]), size)
+
+    @override_settings(CART_STORE_ENABLED=False)
+    def test_database_read(self):
+        self.assert_flat_read(2)
+
+    @override_settings(CART_STORE_ENABLED=True)
+    def test_store_read_on_a_miss(self):
+        self.assert_flat_read(2)
+
+
+class FakeCoinbaseHandler(BaseHTTPRequestHandler):
+    delay = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.headers, body))
+        time.sleep(self.delay)
+        data = {
+            "id": f"charge-{len(self.server.requests)}",
+            "name": body["name"],
+            "hosted_url": "https://commerce.example.com/pay",
+            "local_exchange_rates": {},
+            "addresses": {},
+            "pricing": {"local": body["local_price"]},
+            "expires_at": "2030-01-01T00:00:00Z",
+        }
+        payload = json.dumps({"data": data}).encode()
+        try:
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except BrokenPipeError:
+            # The client timed out and went away.
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    CART_STORE_ENABLED=False,
+    CELERY_BROKER_URL="memory://",
+    CELERY_TASK_ALWAYS_EAGER=True,
+    PAYMENT_READ_TIMEOUT=0.5,
+)
+class CheckoutTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCoinbaseHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        product = create_products(create_business(), 1, images_per_product=0)[0]
+        cls.customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+        cart = Cart.objects.create(user=cls.customer, code="c0de", total=300)
+        CartItem.objects.upsert(cart, {product.pk: 3})
+
+    def setUp(self):
+        self.server.requests.clear()
+        FakeCoinbaseHandler.delay = 0
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def checkout(self, **headers):
+        url = f"http://127.0.0.1:{self.server.server_port}"
+        with self.settings(COINBASE_COMMERCE_API_URL=url):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/cart/checkout", **headers)
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(f"/cart/charges/{response.data['id']}").data
+
+    def test_checkout_creates_one_charge_per_cart(self):
+        charge = self.checkout()
+        self.assertEqual(charge["status"], ChargeStatus.CREATED)
+        self.assertEqual(charge["provider_charge_id"], "charge-1")
+        self.assertEqual(charge["amount"], 300)
+
+        headers, body = self.server.requests[0]
+        self.assertEqual(body["local_price"]["amount"], 310)
+        self.assertTrue(headers["Idempotency-Key"])
+
+        self.assertEqual(self.checkout()["id"], charge["id"])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(CheckoutCharge.objects.count(), 1)
+
+    def test_slow_provider_fails_the_charge_and_can_be_retried(self):
+        FakeCoinbaseHandler.delay = 1
+        charge = self.checkout(HTTP_IDEMPOTENCY_KEY="attempt")
+        self.assertEqual(charge["status"], ChargeStatus.FAILED)
+
+        FakeCoinbaseHandler.delay = 0
+        retried = self.checkout(HTTP_IDEMPOTENCY_KEY="attempt")
+        self.assertEqual(retried["id"], charge["id"])
+        self.assertEqual(retried["status"], ChargeStatus.CREATED)
+
+    def test_charge_left_processing_by_a_dead_worker_is_reclaimed(self):
+        cart = Cart.objects.get(user=self.customer)
+        charge = CheckoutCharge.objects.create(
+            cart=cart,
+            idempotency_key="stuck",
+            amount=300,
+            status=ChargeStatus.PROCESSING,
+        )
+        recent = self.checkout(HTTP_IDEMPOTENCY_KEY="stuck")
+        self.assertEqual(recent["status"], ChargeStatus.PROCESSING)
+        self.assertEqual(self.server.requests, [])
+
+        CheckoutCharge.objects.filter(pk=charge.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+        reclaimed = self.checkout(HTTP_IDEMPOTENCY_KEY="stuck")
+        self.assertEqual(reclaimed["id"], charge.pk)
+        self.assertEqual(reclaimed["status"], ChargeStatus.CREATED)
+        self.assertEqual(self.server.requests[0][0]["Idempotency-Key"], "stuck")
+
+
+@override_settings(
+    CELERY_BROKER_URL="memory://",
+    CELERY_TASK_ALWAYS_EAGER=True,
+    COINBASE_COMMERCE_WEBHOOK_SECRET="whsec",
+    PAYSTACK_SECRET_KEY="sk_test",
+)
+class WebhookTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+        cls.cart = Cart.objects.create(user=customer, code="c0de", total=300)
+        cls.charge = CheckoutCharge.objects.create(
+            cart=cls.cart,
+            idempotency_key="key",
+            amount=300,
+            status=ChargeStatus.CREATED,
+            provider_charge_id="CB-1",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def post(self, provider, payload, secret, digest, header):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(secret.encode(), body, digest).hexdigest()
+        return self.client.post(
+            f"/webhooks/{provider}",
+            body,
+            content_type="application/json",
+            **{header: signature},
+        )
+
+    def coinbase(self, event_id, event_type="charge:confirmed", secret="whsec"):
+        payload = {
+            "event": {
+                "id": event_id,
+                "type": event_type,
+                "data": {
+                    "id": "CB-1",
+                    "metadata": {"order_id": "c0de"},
+                    "pricing": {"local": {"amount": "310.00", "currency": "NGN"}},
+                },
+            }
+        }
+        return self.post(
+            "coinbase",
+            payload,
+            secret,
+            hashlib.sha256,
+            "HTTP_X_CC_WEBHOOK_SIGNATURE",
+        )
+
+    def test_coinbase_event_marks_the_cart_paid_once(self):
+        for _ in range(2):
+            self.assertEqual(self.coinbase("evt-1").status_code, 200)
+            cache.clear()
+        self.assertEqual(self.coinbase("evt-2", "charge:resolved").status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+        self.assertFalse(
+            WebhookEvent.objects.exclude(status=WebhookEventStatus.PROCESSED).exists()
+        )
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.status, CartStatus.PAID)
+        self.assertEqual(self.cart.payment.amount, 310)
+        self.charge.refresh_from_db()
+        self.assertEqual(self.charge.status, ChargeStatus.CONFIRMED)
+
+    def test_invalid_signature_is_rejected(self):
+        self.assertEqual(self.coinbase("evt-1", secret="wrong").status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_malformed_event_is_rejected(self):
+        for event_id, event_type in [
+            (None, "charge:confirmed"),
+            ("evt-1", None),
+            (1, "charge:confirmed"),
+        ]:
+            self.assertEqual(self.coinbase(event_id, event_type).status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def paystack(self, amount, currency="NGN"):
+        payload = {
+            "event": "charge.success",
+            "data": {
+                "id": 42,
+                "reference": "c0de",
+                "amount": amount,
+                "currency": currency,
+            },
+        }
+        return self.post(
+            "paystack",
+            payload,
+            "sk_test",
+            hashlib.sha512,
+            "HTTP_X_PAYSTACK_SIGNATURE",
+        )
+
+    def test_paystack_event(self):
+        self.assertEqual(self.paystack(31000).status_code, 200)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.status, CartStatus.PAID)
+        self.assertEqual(self.cart.payment.amount, 310)
+        self.assertEqual(self.cart.payment.provider, "paystack")
+
+    def test_underpaid_event_does_not_mark_the_cart_paid(self):
+        for amount, currency in [(250, "NGN"), (31000, "USD")]:
+            cache.clear()
+            WebhookEvent.objects.all().delete()
+            self.assertEqual(self.paystack(amount, currency).status_code, 200)
+
+            event = WebhookEvent.objects.get()
+            self.assertEqual(event.status, WebhookEventStatus.FAILED)
+            self.assertIn("owed 310 NGN", event.error)
+            self.cart.refresh_from_db()
+            self.assertNotEqual(self.cart.status, CartStatus.PAID)
+            self.assertFalse(Payment.objects.exists())
+
+
+class ArchiveStaleCartsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(create_business(), 2, images_per_product=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_cart(self, email, idle_days):
+        customer = User.objects.create_user(
+            email=email, password="pass1234", type=UserType.CUSTOMER
+        )
+        cart = Cart.objects.create(user=customer, code=email[:15])
+        CartItem.objects.upsert(cart, {p.pk: 1 for p in self.products})
+        then = timezone.now() - timedelta(days=idle_days)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=then)
+        CartItem.objects.filter(cart=cart).update(updated_at=then)
+        return cart
+
+    def test_idle_carts_move_to_the_archive_in_batches(self):
+        stale = [self.create_cart(f"stale{i}@example.com", 40) for i in range(3)]
+        active = self.create_cart("active@example.com", 1)
+        dirty = self.create_cart("dirty@example.com", 40)
+        cache.set(get_cart_dirty_key(dirty.user_id), 1)
+        cache.set(get_cart_key(stale[0].user_id), {"items": {}})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            metrics = archive_stale_carts(idle_days=30, batch_size=2)
+        self.assertEqual(metrics["carts"], 3)
+        self.assertEqual(metrics["items"], 6)
+        self.assertEqual(metrics["batches"], 2)
+
+        self.assertEqual(
+            set(Cart.objects.values_list("pk", flat=True)), {active.pk, dirty.pk}
+        )
+        self.assertEqual(
+            set(ArchivedCart.objects.values_list("cart_id", flat=True)),
+            {cart.pk for cart in stale},
+        )
+        self.assertEqual(ArchivedCartItem.objects.count(), 6)
+        self.assertFalse(CartItem.objects.filter(cart__in=stale).exists())
+        self.assertIsNone(cache.get(get_cart_key(stale[0].user_id)))
+
+    def test_a_batch_of_dirty_carts_does_not_stop_the_run(self):
+        dirty = [self.create_cart(f"dirty{i}@example.com", 40) for i in range(2)]
+        stale = self.create_cart("stale@example.com", 40)
+        cache.set_many({get_cart_dirty_key(cart.user_id): 1 for cart in dirty})
+
+        metrics = archive_stale_carts(idle_days=30, batch_size=2)
+        self.assertEqual(metrics["carts"], 1)
+        self.assertEqual(
+            list(ArchivedCart.objects.values_list("cart_id", flat=True)), [stale.pk]
+        )
+
+    def test_zero_idle_days_is_not_the_default(self):
+        cart = self.create_cart("recent@example.com", 1)
+
+        self.assertEqual(archive_stale_carts(idle_days=30)["carts"], 0)
+        self.assertEqual(archive_stale_carts(idle_days=0)["carts"], 1)
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
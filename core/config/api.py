@@ -1,24 +1,67 @@
-import hmac
-import hashlib
 import json
 
-from django.conf import settings
+from django.core.cache import cache
 
-from decouple import config
-
-from paystackapi.paystack import Paystack
+from drf_yasg.utils import swagger_auto_schema
+from kombu.exceptions import OperationalError
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from core.cart.models import WebhookEvent
+from core.cart.payments import parse_webhook_event, verify_webhook_signature
+from core.cart.tasks import process_webhook_events
+from core.config.choices import WebhookProvider
+
+WEBHOOK_TRIGGER_KEY = "webhooks:scheduled"
+WEBHOOK_TRIGGER_DELAY = 2
+
+
+def schedule_webhook_processing():
+    # Coalesce bursts into one consumer run; the beat schedule picks up
+    # anything left behind if the broker is unavailable.
+    if cache.add(WEBHOOK_TRIGGER_KEY, 1, WEBHOOK_TRIGGER_DELAY):
+        try:
+            process_webhook_events.apply_async(countdown=WEBHOOK_TRIGGER_DELAY)
+        except OperationalError:
+            pass
+
 
 class WebHookViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
+    authentication_classes = []
 
-    @action(detail=False, methods=["post"])
-    def paystack_webhook(self, request):
-        secret = settings.PAYSTACK_SECRET_KEY
-        paystack = Paystack(secret_key=secret)
-        transaction = paystack.transaction.list()
+    def receive(self, request, provider, signature):
+        if not verify_webhook_signature(provider, request.body, signature):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload = json.loads(request.body)
+            event_id, event_type = parse_webhook_event(provider, payload)
+            if not isinstance(event_id, str) or not isinstance(event_type, str):
+                raise TypeError("Event id and type must be strings")
+        except (ValueError, KeyError, TypeError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        event = WebhookEvent(
+            provider=provider,
+            event_id=event_id[:255],
+            event_type=event_type[:255],
+            payload=payload,
+        )
+        WebhookEvent.objects.bulk_create([event], ignore_conflicts=True)
+        schedule_webhook_processing()
         return Response(status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
+    @action(detail=False, methods=["post"])
+    def coinbase(self, request):
+        signature = request.headers.get("X-CC-Webhook-Signature")
+        return self.receive(request, WebhookProvider.COINBASE, signature)
+
+    @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
+    @action(detail=False, methods=["post"])
+    def paystack(self, request):
+        signature = request.headers.get("X-Paystack-Signature")
+        return self.receive(request, WebhookProvider.PAYSTACK, signature)
@@ -67,3 +67,41 @@ class CartStatus(models.TextChoices):
     PAID = "paid", "Paid"
     PROCESSING = "processing", "Processing"
     ARCHIVED = "archived", "Archived"
+
+
+class ChargeStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    CREATED = "created", "Created"
+    CONFIRMED = "confirmed", "Confirmed"
+    FAILED = "failed", "Failed"
+
+
+class WebhookProvider(models.TextChoices):
+    COINBASE = "coinbase", "Coinbase"
+    PAYSTACK = "paystack", "Paystack"
+
+
+class WebhookEventStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSED = "processed", "Processed"
+    FAILED = "failed", "Failed"
+
+
+class ImportJobStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    COMPLETED = "completed", "Completed"
+    FAILED = "failed", "Failed"
+
+
+class ImportConflictPolicy(models.TextChoices):
+    IGNORE = "ignore", "Ignore"
+    UPDATE = "update", "Update"
+
+
+class ImageStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    READY = "ready", "Ready"
+    FAILED = "failed", "Failed"
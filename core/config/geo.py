@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+KM_PER_DEGREE = 111.32
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    code = []
+    bits = 0
+    value = 0
+    even = True
+    while len(code) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            code.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(code)
+
+
+def get_cell_size(precision):
+    # (height, width) of a geohash cell in degrees.
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def get_search_precision(latitude, radius_km):
+    # The longest prefix whose cells are at least `radius_km` across, so the
+    # cell holding the point plus its eight neighbours cover the whole circle.
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = get_cell_size(precision)
+        if (
+            height * KM_PER_DEGREE >= radius_km
+            and width * KM_PER_DEGREE * cos_lat >= radius_km
+        ):
+            return precision
+    return 0
+
+
+def get_bounding_box(latitude, radius_km):
+    # Half-height and half-width in degrees of a box holding the circle.
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlat = radius_km / KM_PER_DEGREE
+    return dlat, min(dlat / cos_lat, 180.0)
+
+
+def get_search_cells(latitude, longitude, radius_km):
+    precision = get_search_precision(latitude, radius_km)
+    if precision == 0:
+        return None
+
+    height, width = get_cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        lat = latitude + dlat
+        if not -90 <= lat <= 90:
+            continue
+        for dlon in (-width, 0, width):
+            lon = (longitude + dlon + 180) % 360 - 180
+            cells.add(encode_geohash(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=float) - longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class GoogleGeocoder:
+    def __init__(self):
+        from geopy.geocoders import GoogleV3
+
+        self.client = GoogleV3(
+            api_key=settings.GOOGLE_MAP_API_KEY, timeout=settings.GEOCODING_TIMEOUT
+        )
+
+    def geocode(self, address):
+        location = self.client.geocode(address)
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+class LocalGeocoder:
+    # Resolves addresses from GEOCODING_LOCAL_PLACES; used in development and
+    # tests so no request leaves the machine.
+    def geocode(self, address):
+        return settings.GEOCODING_LOCAL_PLACES.get(address.strip().lower())
+
+
+def get_geocoder():
+    return import_string(settings.GEOCODING_BACKEND)()
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+from pilkit.processors import ResizeToFit
+
+from core.config.choices import ImageStatus
+from core.config.models import ImageAsset
+from core.config.storage import share_cloudinary_connections
+
+RENDITIONS = {
+    "thumbnail": (150, 150),
+    "card": (600, 600),
+    "full": (1600, 1600),
+}
+JPEG_QUALITY = 85
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Sent by the worker once every rendition of an asset is stored.
+image_asset_ready = Signal()
+
+
+class LocalImageStorage:
+    # Writes renditions under MEDIA_ROOT; used in development and tests.
+    def __init__(self):
+        self.storage = FileSystemStorage(
+            location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL
+        )
+
+    def save(self, name, content):
+        name = self.storage.save(name, ContentFile(content))
+        return self.storage.url(name)
+
+
+class CloudinaryImageStorage:
+    def __init__(self):
+        share_cloudinary_connections()
+
+    def save(self, name, content):
+        import cloudinary.uploader
+
+        res = cloudinary.uploader.upload(
+            content, public_id=os.path.splitext(name)[0], overwrite=True
+        )
+        return res["secure_url"]
+
+
+def get_image_storage():
+    return import_string(settings.IMAGE_STORAGE_BACKEND)()
+
+
+def render_image(image, size):
+    image = ResizeToFit(*size, upscale=False).process(image)
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "P"):
+        image.save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), "png"
+    image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), "jpg"
+
+
+def create_renditions(asset, storage=None):
+    storage = storage or get_image_storage()
+    with asset.original.open("rb") as file:
+        image = Image.open(file)
+        # Let the JPEG decoder downscale while reading; every rendition is
+        # at most the size of the largest one.
+        image.draft("RGB", max(RENDITIONS.values()))
+        image = ImageOps.exif_transpose(image)
+        contents = {
+            name: render_image(image, size) for name, size in RENDITIONS.items()
+        }
+
+    # Rendering is quick next to the uploads, so those go out side by side.
+    with ThreadPoolExecutor(max_workers=len(contents)) as executor:
+        futures = {
+            name: executor.submit(
+                storage.save, f"images/{asset.pk}/{name}.{extension}", content
+            )
+            for name, (content, extension) in contents.items()
+        }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def get_content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def get_reusable_assets(content_hashes):
+    assets = (
+        ImageAsset.objects.filter(content_hash__in=content_hashes)
+        .exclude(status=ImageStatus.FAILED)
+        .order_by("-id")
+    )
+    return {asset.content_hash: asset for asset in assets}
+
+
+def schedule_image_asset(asset):
+    from core.config.tasks import process_image_asset
+
+    transaction.on_commit(lambda: process_image_asset.delay(asset.pk))
+
+
+def verify_image(file):
+    try:
+        with Image.open(file) as image:
+            image.verify()
+    except Exception:
+        raise ValueError("Upload a valid image")
+    file.seek(0)
+
+
+def create_image_asset(file):
+    # Identical bytes share one asset, so a re-upload is neither stored nor
+    # rendered again.
+    verify_image(file)
+    content_hash = get_content_hash(file)
+    asset = get_reusable_assets([content_hash]).get(content_hash)
+    if asset is None:
+        asset = ImageAsset.objects.create(original=file, content_hash=content_hash)
+        schedule_image_asset(asset)
+    return asset
+
+
+def hash_image(file):
+    verify_image(file)
+    return get_content_hash(file)
+
+
+def save_original(file):
+    field = ImageAsset._meta.get_field("original")
+    return field.storage.save(field.generate_filename(None, file.name), file)
+
+
+def run_in_pool(executor, func, items):
+    # Returns what `func` returned, or the exception it raised, for each item.
+    futures = [executor.submit(func, item) for item in items]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def create_image_assets(files):
+    # Returns an asset, or the exception that stopped it, for each file. Only
+    # content not seen before is stored, once per request. Verifying, hashing
+    # and storing are I/O bound, so they share a bounded pool; this thread
+    # only runs the queries.
+    with ThreadPoolExecutor(max_workers=settings.IMAGE_UPLOAD_WORKERS) as executor:
+        content_hashes = run_in_pool(executor, hash_image, files)
+        assets = get_reusable_assets(
+            [h for h in content_hashes if not isinstance(h, Exception)]
+        )
+        new_files = {}
+        for file, content_hash in zip(files, content_hashes):
+            if not isinstance(content_hash, Exception) and content_hash not in assets:
+                new_files.setdefault(content_hash, file)
+        names = run_in_pool(executor, save_original, new_files.values())
+
+    created = []
+    for content_hash, name in zip(new_files, names):
+        if isinstance(name, Exception):
+            assets[content_hash] = name
+        else:
+            created.append(ImageAsset(original=name, content_hash=content_hash))
+
+    with transaction.atomic():
+        ImageAsset.objects.bulk_create(created)
+        for asset in created:
+            assets[asset.content_hash] = asset
+            schedule_image_asset(asset)
+    return [
+        content_hash if isinstance(content_hash, Exception) else assets[content_hash]
+        for content_hash in content_hashes
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("config", "0001_image_asset"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imageasset",
+            name="content_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -1,3 +1,15 @@
 from django.db import models
 
-# Create your models here.
+from core.config.choices import ImageStatus
+
+
+class ImageAsset(models.Model):
+    original = models.FileField(upload_to="images/originals/")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.PENDING
+    )
+    renditions = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
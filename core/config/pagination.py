@@ -1,3 +1,10 @@
+import base64
+import json
+import math
+
+from django.db.models import Q
+
+from rest_framework import serializers
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -5,3 +12,61 @@ class StandardResultSetPagination(PageNumberPagination):
     page_size = 10
     max_page_size = 100
     page_size_query_param = "page_size"
+
+
+def get_page_params(request, default_limit=100, max_limit=1000):
+    try:
+        page = int(request.GET.get("page", 1))
+        limit = int(request.GET.get("limit", default_limit))
+    except ValueError:
+        raise serializers.ValidationError({"detail": "Invalid page or limit"})
+    return max(page, 1), min(max(limit, 1), max_limit)
+
+
+def get_total_pages(count, limit):
+    return math.ceil(count / limit) if count else 0
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise serializers.ValidationError({"detail": "Invalid cursor"})
+    return values
+
+
+def paginate_queryset_by_offset(queryset, page, limit, count=None):
+    if count is None:
+        count = queryset.count()
+    offset = (page - 1) * limit
+    return count, list(queryset[offset : offset + limit])
+
+
+def paginate_queryset_by_keyset(queryset, cursor, limit, fields=("name", "id")):
+    # `queryset` must be ordered by `fields` ascending, the last one unique.
+    # Nothing is counted: a keyset page only reads its own rows.
+    if cursor:
+        values = decode_cursor(cursor, len(fields))
+        seek = Q()
+        for i, field in enumerate(fields):
+            condition = Q(**{f"{field}__gt": values[i]})
+            for prev_field, prev_value in zip(fields[:i], values[:i]):
+                condition &= Q(**{prev_field: prev_value})
+            seek |= condition
+        queryset = queryset.filter(seek)
+
+    rows = list(queryset[: limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field) for field in fields])
+    return rows, next_cursor
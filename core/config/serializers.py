@@ -1,5 +1,13 @@
 from rest_framework import serializers
 
+from core.config.models import ImageAsset
+
 
 class IdListSerializer(serializers.Serializer):
     ids = serializers.ListField(child=serializers.IntegerField())
+
+
+class ImageAssetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageAsset
+        fields = ["id", "status", "renditions"]
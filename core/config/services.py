@@ -1,7 +1,10 @@
 import functools
+import hashlib
 from uuid import uuid4
 
 from django.http.response import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 from rest_framework import viewsets
 
@@ -25,3 +28,21 @@ def filter_http_method_names(method_list: list):
 
 def generate_order_code():
     return str(uuid4()).upper()[:10]
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def get_not_modified_response(request, etag=None, last_modified=None):
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
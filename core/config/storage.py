@@ -0,0 +1,90 @@
+import functools
+import os
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from requests.adapters import HTTPAdapter
+
+DOWNLOAD_TIMEOUT = 30
+
+
+@functools.lru_cache(maxsize=None)
+def get_http_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=settings.IMAGE_UPLOAD_WORKERS))
+    return session
+
+
+@functools.lru_cache(maxsize=None)
+def share_cloudinary_connections():
+    # The uploader sends every request through one module-level PoolManager
+    # that keeps a single connection per host, so parallel uploads would each
+    # open a connection and then drop it. Sized to the upload workers, every
+    # worker keeps its connection for the next upload.
+    import cloudinary
+    import cloudinary.uploader
+    from cloudinary.utils import get_http_connector
+
+    options = dict(cloudinary.CERT_KWARGS, maxsize=settings.IMAGE_UPLOAD_WORKERS)
+    cloudinary.uploader._http = get_http_connector(cloudinary.config(), options)
+
+
+class CloudinaryFileStorage(Storage):
+    # Keeps uploaded files (image originals, product imports) in Cloudinary as
+    # raw resources, so the Celery worker that reads them does not have to
+    # share a disk with the web process that received them.
+    def __init__(self):
+        share_cloudinary_connections()
+
+    def _save(self, name, content):
+        import cloudinary.uploader
+
+        content.seek(0)
+        res = cloudinary.uploader.upload(
+            content, public_id=name, resource_type="raw", overwrite=False
+        )
+        return res["public_id"]
+
+    def _open(self, name, mode="rb"):
+        response = get_http_session().get(self.url(name), timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return ContentFile(response.content, name=name)
+
+    def get_available_name(self, name, max_length=None):
+        # A random suffix up front instead of an Admin API call per upload to
+        # find a free name.
+        dir_name, file_name = os.path.split(name)
+        file_root, file_ext = os.path.splitext(file_name)
+        if max_length:
+            # Leave room for the "_" and seven characters the suffix adds.
+            room = max_length - (len(name) - len(file_root)) - 8
+            file_root = file_root[: max(room, 1)]
+        return os.path.join(dir_name, self.get_alternative_name(file_root, file_ext))
+
+    def url(self, name):
+        import cloudinary.utils
+
+        url, _ = cloudinary.utils.cloudinary_url(name, resource_type="raw", secure=True)
+        return url
+
+    def exists(self, name):
+        import cloudinary.api
+        import cloudinary.exceptions
+
+        try:
+            cloudinary.api.resource(name, resource_type="raw")
+        except cloudinary.exceptions.NotFound:
+            return False
+        return True
+
+    def size(self, name):
+        import cloudinary.api
+
+        return cloudinary.api.resource(name, resource_type="raw")["bytes"]
+
+    def delete(self, name):
+        import cloudinary.uploader
+
+        cloudinary.uploader.destroy(name, resource_type="raw")
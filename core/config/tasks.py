@@ -0,0 +1,33 @@
+from celery import shared_task
+from django.utils import timezone
+
+from core.config.choices import ImageStatus
+from core.config.media import create_renditions, image_asset_ready
+from core.config.models import ImageAsset
+
+
+@shared_task
+def process_image_asset(asset_id):
+    assets = ImageAsset.objects.filter(pk=asset_id)
+
+    # A redelivered message must not render the same image twice.
+    if not assets.filter(status=ImageStatus.PENDING).update(
+        status=ImageStatus.PROCESSING, updated_at=timezone.now()
+    ):
+        return
+
+    asset = assets.get()
+    try:
+        renditions = create_renditions(asset)
+    except Exception as e:
+        assets.update(
+            status=ImageStatus.FAILED, error=str(e), updated_at=timezone.now()
+        )
+        raise
+
+    assets.update(
+        status=ImageStatus.READY, renditions=renditions, updated_at=timezone.now()
+    )
+    asset.status = ImageStatus.READY
+    asset.renditions = renditions
+    image_asset_ready.send(sender=ImageAsset, asset=asset)
@@ -1,3 +1,90 @@
+from unittest import mock
+
+from django.core.files.base import ContentFile
 from django.test import TestCase
 
-# Create your tests here.
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from core.config.pagination import (
+    decode_cursor,
+    encode_cursor,
+    paginate_queryset_by_keyset,
+)
+from core.config.storage import CloudinaryFileStorage
+from core.product.models import Product
+from core.product.tests import create_business
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        # Names repeat, so only the id breaks the tie between pages.
+        Product.objects.bulk_create(
+            [
+                Product(business=cls.business, name=name, product_no=f"N-{i}", price=1)
+                for i, name in enumerate(["Bag", "Cup", "Bag", "Apple", "Cup", "Bag"])
+            ]
+        )
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor(["Bag, large", 42])
+        self.assertEqual(decode_cursor(cursor, 2), ["Bag, large", 42])
+
+    def test_invalid_cursors(self):
+        for cursor in ["not base64!", encode_cursor(["Bag"]), encode_cursor({"a": 1})]:
+            with self.assertRaises(serializers.ValidationError):
+                decode_cursor(cursor, 2)
+
+    def test_pages_walk_ties_in_order_without_counting(self):
+        queryset = Product.objects.order_by("name", "id")
+        expected = list(queryset.values_list("pk", flat=True))
+
+        seen = []
+        cursor = ""
+        while cursor is not None:
+            with self.assertNumQueries(1):
+                rows, cursor = paginate_queryset_by_keyset(queryset, cursor, 2)
+            seen += [row.pk for row in rows]
+        self.assertEqual(seen, expected)
+
+    def test_owner_list_cursor_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.business.owner)
+        url = f"/businesses/{self.business.pk}/products"
+
+        response = client.get(url, {"cursor": "", "limit": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], Product.objects.count())
+        self.assertEqual(response.data["total_pages"], 2)
+        first = [p["id"] for p in response.data["data"]]
+
+        response = client.get(url, {"cursor": response.data["next_cursor"], "limit": 4})
+        self.assertIsNone(response.data["next_cursor"])
+        self.assertEqual(
+            first + [p["id"] for p in response.data["data"]],
+            list(Product.objects.order_by("name", "id").values_list("pk", flat=True)),
+        )
+
+        response = client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CloudinaryFileStorageTest(TestCase):
+    def test_uploads_are_raw_resources_under_a_fresh_name(self):
+        storage = CloudinaryFileStorage()
+        with mock.patch("cloudinary.uploader.upload") as upload:
+            upload.side_effect = lambda content, **options: options
+            name = storage.save(
+                "imports/products/" + "a" * 120 + ".csv",
+                ContentFile(b"x"),
+                max_length=100,
+            )
+
+        self.assertTrue(name.startswith("imports/products/aaa"))
+        self.assertTrue(name.endswith(".csv"))
+        self.assertLessEqual(len(name), 100)
+        self.assertEqual(upload.call_args.kwargs["resource_type"], "raw")
+        self.assertFalse(upload.call_args.kwargs["overwrite"])
+        self.assertIn("/raw/upload/", storage.url(name))
@@ -1,12 +1,13 @@
-import csv
-import io
-import math
+import hashlib
 
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, get_list_or_404
+from django.utils import timezone
 
-import cloudinary
-import cloudinary.uploader
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from pyqrcode import QRCode
@@ -25,6 +26,7 @@ from rest_framework.response import Response
 
 from core.cart.models import Cart, CartItem
 from core.config.choices import UserType
+from core.config.media import create_image_asset, create_image_assets
 from core.business.models import Business
 from core.product.models import ProductImage
 from core.config.permissions import (
@@ -34,17 +36,58 @@ from core.config.permissions import (
 )
 from core.accounts.models import User
 from core.cart.serializers import CartItemCreateUpdateSerializer, CartListSerializer
+from core.config.pagination import (
+    get_page_params,
+    get_total_pages,
+    paginate_queryset_by_keyset,
+    paginate_queryset_by_offset,
+)
 from core.config.schema import get_auto_schema_class_by_tags
+from core.config.services import (
+    get_not_modified_response,
+    make_etag,
+    set_validators,
+)
 from core.config.utils import generate_code
-from core.product.models import Product, ProductFavorite
+from core.product.cache import (
+    bump_catalog_version,
+    get_business_version,
+    get_cache_stats,
+    get_cached_list,
+    get_catalog_version,
+    get_list_cache_key,
+    get_cached_product,
+    set_cached_list,
+    set_cached_product,
+)
+from core.product.models import Product, ProductFavorite, ProductImportJob
+from core.product.services import (
+    ProductImporter,
+    export_products_csv,
+    export_products_ndjson,
+    read_product_csv,
+)
+from core.product.tasks import process_product_import
 from core.product.serializers import (
     ProductBasicSerializer,
     ProductCreateUpdateSerializer,
     ProductFavoriteListSerializer,
     ProductImageListSerializer,
+    ProductImportJobSerializer,
     ProductListSerializer,
+    ProductPopularSerializer,
+    ProductSuggestionListSerializer,
 )
 
+EXPORT_FORMATS = {
+    "csv": ("text/csv", export_products_csv),
+    "ndjson": ("application/x-ndjson", export_products_ndjson),
+}
+POPULAR_MAX_LIMIT = 100
+SUGGEST_CACHE_TIMEOUT = 60
+SUGGEST_MAX_LENGTH = 64
+SUGGEST_MAX_LIMIT = 20
+
 
 class ProductViewSet(
     mixins.CreateModelMixin,
@@ -52,7 +95,7 @@ class ProductViewSet(
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Product.objects.all().order_by("name")
+    queryset = Product.objects.all().order_by("name", "id")
     swagger_schema = get_auto_schema_class_by_tags(["businesses"])
     permission_classes = [BusinessOwnerPermission | AdminOnlyPermission]
 
@@ -73,9 +116,19 @@ class ProductViewSet(
                 type=openapi.TYPE_FILE,
                 required=True,
                 description="Document",
-            )
+            ),
+            openapi.Parameter(
+                "async",
+                openapi.IN_QUERY,
+                description="queue the import and return a job to poll",
+                type=openapi.TYPE_BOOLEAN,
+            ),
         ],
-        responses={400: "Invalid data in uploaded file", 200: "Success"},
+        responses={
+            400: "Invalid file",
+            200: "Import report with the created count and per-line errors",
+            202: ProductImportJobSerializer,
+        },
     )
     @action(
         detail=False,
@@ -88,58 +141,85 @@ class ProductViewSet(
         file = request.FILES.get("file")
         business = get_object_or_404(Business, pk=self.kwargs["business_pk"])
 
-        if not file.name.endswith(".csv"):
+        if not file or not file.name.endswith(".csv"):
             msg = "Wrong format! Make sure its a CSV(.csv) file."
             raise serializers.ValidationError({"detail": msg})
 
-        decoded_file = file.read().decode()
-        io_string = io.StringIO(decoded_file)
-        csv_reader = csv.reader(io_string, delimiter=",")
-        file.close()
-
-        line_count = 0
-        product_list = []
-        for data in csv_reader:
-            if line_count == 0:
-                line_count += 1
-                continue
-
-            serializer = ProductCreateUpdateSerializer(
-                data={
-                    "name": data[0],
-                    "product_no": data[1],
-                    "description": data[2],
-                    "category": data[3],
-                    "unit": data[4],
-                    "price": data[5],
-                    "tax": data[6] or 0,
-                }
+        if request.GET.get("async") in ["1", "true"]:
+            job = ProductImportJob.objects.create(
+                business=business, created_by=request.user, file=file
             )
+            transaction.on_commit(lambda: process_product_import.delay(job.pk))
+            data = ProductImportJobSerializer(job).data
+            return Response(data=data, status=status.HTTP_202_ACCEPTED)
 
-            serializer.is_valid(raise_exception=True)
+        importer = ProductImporter(business).run(read_product_csv(file.file))
+        file.close()
+        return Response(data=importer.get_report(), status=status.HTTP_200_OK)
 
-            if Product.objects.filter(name=data[0], product_no=data[1]).exists():
-                msg = f"Product record in {line_count} already exists"
-                raise serializers.ValidationError({"detail": msg})
+    @swagger_auto_schema(
+        request_body=None,
+        responses={status.HTTP_200_OK: ProductImportJobSerializer},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"import_jobs/(?P<job_pk>[\d]+)",
+    )
+    def import_job(self, request, *args, **kwargs):
+        job = get_object_or_404(
+            ProductImportJob,
+            pk=self.kwargs["job_pk"],
+            business_id=self.kwargs["business_pk"],
+            business__owner=request.user,
+        )
+        data = ProductImportJobSerializer(job).data
+        return Response(data=data, status=status.HTTP_200_OK)
 
-            product = Product(business=business, **serializer.validated_data)
-            product_list.append(product)
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "file_type",
+                openapi.IN_QUERY,
+                description="csv (batch_upload layout) or ndjson",
+                type=openapi.TYPE_STRING,
+                enum=list(EXPORT_FORMATS),
+            ),
+        ],
+        responses={status.HTTP_200_OK: "Streamed catalog file"},
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request, *args, **kwargs):
+        file_type = request.GET.get("file_type", "csv")
+        if file_type not in EXPORT_FORMATS:
+            msg = f"file_type must be one of: {', '.join(EXPORT_FORMATS)}"
+            raise serializers.ValidationError({"detail": msg})
 
-        Product.objects.bulk_create(product_list)
-        return Response()
+        products = Product.objects.filter(
+            business__owner=request.user, business_id=self.kwargs["business_pk"]
+        ).order_by("id")
+        content_type, export = EXPORT_FORMATS[file_type]
+        response = StreamingHttpResponse(export(products), content_type=content_type)
+        filename = f"products-{self.kwargs['business_pk']}.{file_type}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
     @swagger_auto_schema(responses={status.HTTP_201_CREATED: ProductListSerializer})
     def create(self, request, *args, **kwargs):
         business = self.get_business().first()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = serializer.validated_data
 
         if Product.objects.filter(
-            name=request.data["name"], product_no=request.data["product_no"]
+            name=fields["name"], product_no=fields.get("product_no", "")
         ).exists():
             raise serializers.ValidationError(
                 {"detail": "Product with the given information already exists"}
             )
 
-        product = Product.objects.create(**request.data, business=business)
+        product = Product.objects.create(**fields, business=business)
+        Product.objects.filter(pk=product.pk).update_search_vector()
         data = ProductBasicSerializer(product).data
         return Response(data=data)
 
@@ -163,12 +243,17 @@ class ProductViewSet(
                 description="param to get products by name",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="keyset cursor, pass empty for the first page",
+                type=openapi.TYPE_STRING,
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        page = int(request.GET.get("page", 1))
-        limit = int(request.GET.get("limit", 100))
-        offset = (page - 1) * limit if page > 1 else 0
+        page, limit = get_page_params(request)
+        cursor = request.GET.get("cursor")
         search = request.GET.get("search")
         products = self.get_queryset().filter(
             business__owner=request.user, business_id=self.kwargs["business_pk"]
@@ -181,28 +266,60 @@ class ProductViewSet(
                 | Q(description__icontains=search)
             )
 
-        data = self.get_serializer(products, many=True).data
-
-        total_count = len(data)
-        total_pages = total_count / limit
-        if int(total_pages) == 0:
-            total_pages = 0
-        elif int(total_pages) < 1:
-            total_pages = 1
+        validators = products.aggregate(
+            count=Count("id"), last_modified=Max("updated_at")
+        )
+        etag = make_etag(
+            request.user.pk,
+            validators["count"],
+            validators["last_modified"],
+            request.GET.urlencode(),
+        )
+        # Max(updated_at) cannot see deletes, so it only feeds the ETag (with
+        # the count) and is never sent as Last-Modified on its own.
+        not_modified = get_not_modified_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+
+        # The count comes from the validators query, so neither kind of page
+        # counts again; keyset pages only skip the OFFSET scan.
+        total_count = validators["count"]
+        res = {}
+        if cursor is not None:
+            products, res["next_cursor"] = paginate_queryset_by_keyset(
+                products, cursor, limit
+            )
         else:
-            total_pages = math.ceil(total_pages)
-        return Response(
+            total_count, products = paginate_queryset_by_offset(
+                products, page, limit, count=total_count
+            )
+
+        data = self.get_serializer(products, many=True).data
+        response = Response(
             {
                 "count": total_count,
-                "total_pages": total_pages,
-                "data": data[offset : offset + limit],
+                "total_pages": get_total_pages(total_count, limit),
+                "data": data,
+                **res,
             }
         )
+        return set_validators(response, etag=etag)
 
     def update(self, request, *args, **kwargs):
-        business = self.get_business().first()
+        business = get_object_or_404(self.get_business())
         product = Product.objects.filter(business=business, pk=self.kwargs["pk"])
-        product.update(business=business, **request.data)
+        if not product.exists():
+            raise Http404
+
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        fields = serializer.validated_data
+
+        product.update(business=business, updated_at=timezone.now(), **fields)
+        product.update_search_vector()
+        if "price" in fields:
+            Cart.objects.filter(orders__product__in=product).refresh_totals()
+        bump_catalog_version([business.pk])
         product = product.first()
         data = ProductBasicSerializer(product).data
         return Response(data=data)
@@ -218,13 +335,9 @@ class ProductFavoriteViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         responses={status.HTTP_200_OK: None},
     )
     def create(self, request, *args, **kwargs):
-        product = get_object_or_404(Product, pk=self.kwargs["id"])
-
-        if ProductFavorite.objects.filter(user=request.user, product=product).exists():
-            ProductFavorite.objects.filter(user=request.user, product=product).delete()
-            return Response(status=status.HTTP_200_OK)
-
-        ProductFavorite.objects.create(user=request.user, product=product)
+        favorite = ProductFavorite.objects.toggle(request.user, self.kwargs["id"])
+        if favorite is None:
+            raise Http404
         return Response(status=status.HTTP_200_OK)
 
 
@@ -232,7 +345,15 @@ class ProductBasicViewSet(
     mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
 ):
     queryset = (
-        Product.objects.all().prefetch_related("business", "discount").order_by("-name")
+        Product.objects.all()
+        .select_related("business", "discount")
+        .prefetch_related(
+            Prefetch(
+                "images",
+                queryset=ProductImage.objects.select_related("asset").order_by("id"),
+            )
+        )
+        .order_by("-name")
     )
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
@@ -242,8 +363,34 @@ class ProductBasicViewSet(
     def get_serializer_class(self):
         if self.action == "add_to_cart":
             return CartItemCreateUpdateSerializer
-        if self.action == "list":
+        if self.action in ["list", "retrieve"]:
             return ProductListSerializer
+        if self.action == "popular":
+            return ProductPopularSerializer
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description=f"number of products, at most {POPULAR_MAX_LIMIT}",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={status.HTTP_200_OK: ProductPopularSerializer},
+    )
+    @action(detail=False, methods=["get"])
+    def popular(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get("limit", 20)), POPULAR_MAX_LIMIT)
+        except ValueError:
+            raise serializers.ValidationError({"detail": "Invalid limit"})
+
+        products = self.get_queryset().order_by("-favorite_count", "id")[
+            : max(limit, 0)
+        ]
+        data = self.get_serializer(products, many=True).data
+        return Response(data=data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         request_body=None, responses={status.HTTP_200_OK: ProductListSerializer}
@@ -254,11 +401,52 @@ class ProductBasicViewSet(
             msg = "Sign in to create or view your favorite products"
             raise serializers.ValidationError({"detail": msg})
 
-        items = get_list_or_404(ProductFavorite, user=request.user)
+        items = get_list_or_404(
+            ProductFavorite.objects.select_related("product"), user=request.user
+        )
         data = ProductFavoriteListSerializer(items, many=True).data
 
         return Response(data=data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="prefix typed in the search box",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "limit",
+                openapi.IN_QUERY,
+                description=f"number of suggestions, at most {SUGGEST_MAX_LIMIT}",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={status.HTTP_200_OK: ProductSuggestionListSerializer},
+    )
+    @action(detail=False, methods=["get"])
+    def suggest(self, request, *args, **kwargs):
+        text = request.GET.get("q", "").strip().lower()[:SUGGEST_MAX_LENGTH]
+        try:
+            limit = min(int(request.GET.get("limit", 10)), SUGGEST_MAX_LIMIT)
+        except ValueError:
+            raise serializers.ValidationError({"detail": "Invalid limit"})
+
+        if not text or limit < 1:
+            return Response(data={"products": [], "businesses": []})
+
+        digest = hashlib.md5(text.encode()).hexdigest()
+        cache_key = f"products:suggest:{limit}:{digest}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = {
+                "products": list(Product.objects.suggest(text, limit)),
+                "businesses": list(Business.objects.suggest(text, limit)),
+            }
+            cache.set(cache_key, data, SUGGEST_CACHE_TIMEOUT)
+        return Response(data=data, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(request_body=CartItemCreateUpdateSerializer)
     @action(detail=False, methods=["post"])
     def add_to_cart(self, request, *args, **kwargs):
@@ -273,22 +461,52 @@ class ProductBasicViewSet(
         request_body=None, responses={status.HTTP_200_OK: ProductListSerializer}
     )
     def list(self, request, *args, **kwargs):
-        search_q = request.GET.get("search")
-        qs = (
-            (
-                self.get_queryset().filter(
-                    Q(name__icontains=search_q)
-                    | Q(product_no__icontains=search_q)
-                    | Q(description__icontains=search_q)
-                    | Q(category__icontains=search_q)
-                )
+        cache_key = get_list_cache_key(request.GET)
+        etag = make_etag(cache_key)
+        not_modified = get_not_modified_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+
+        data = get_cached_list(cache_key)
+        if data is None:
+            search_q = request.GET.get("search")
+            qs = self.get_queryset()
+            if search_q:
+                qs = qs.search(search_q)
+
+            data = self.get_serializer(qs, many=True).data
+            set_cached_list(cache_key, data)
+        response = Response(data=data, status=status.HTTP_200_OK)
+        return set_validators(response, etag=etag)
+
+    @swagger_auto_schema(
+        request_body=None, responses={status.HTTP_200_OK: ProductListSerializer}
+    )
+    def retrieve(self, request, *args, **kwargs):
+        etag = make_etag("product", self.kwargs["pk"], get_catalog_version())
+        not_modified = get_not_modified_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+
+        data = get_cached_product(self.kwargs["pk"])
+        if data is None:
+            business_id = (
+                self.get_queryset()
+                .filter(pk=self.kwargs["pk"])
+                .values_list("business_id", flat=True)
+                .first()
             )
-            if search_q
-            else self.get_queryset()
-        )
+            version = get_business_version(business_id)
+            product = self.get_object()
+            data = self.get_serializer(product).data
+            set_cached_product(product, data, version)
+        response = Response(data=data, status=status.HTTP_200_OK)
+        return set_validators(response, etag=etag)
 
-        data = self.get_serializer(qs, many=True).data
-        return Response(data=data, status=status.HTTP_200_OK)
+    @swagger_auto_schema(request_body=None, responses={status.HTTP_200_OK: None})
+    @action(detail=False, methods=["get"], permission_classes=[AdminOnlyPermission])
+    def cache_stats(self, request, *args, **kwargs):
+        return Response(data=get_cache_stats(), status=status.HTTP_200_OK)
 
 
 class ProductImageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -311,7 +529,7 @@ class ProductImageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
             )
         ],
         request_body=None,
-        responses={status.HTTP_200_OK: ProductImageListSerializer},
+        responses={status.HTTP_202_ACCEPTED: ProductImageListSerializer},
     )
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -320,14 +538,79 @@ class ProductImageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         if not product.business.owner == user:
             raise serializers.ValidationError({"detail": "Not allowed"})
 
-        if ProductImage.objects.filter(name=str(file)).exists():
-            msg = "Image with the same name already exists"
-            raise serializers.ValidationError({"detail": msg})
+        if file is None:
+            raise serializers.ValidationError({"file": "This field is required."})
+
+        # Only the original is stored here; renditions are made by a worker
+        # and fill in `url` once the asset is ready.
+        with transaction.atomic():
+            try:
+                asset = create_image_asset(file)
+            except ValueError as e:
+                raise serializers.ValidationError({"file": str(e)})
+            image = ProductImage.objects.create(
+                product=product,
+                name=str(file),
+                url=asset.renditions.get("full", ""),
+                asset=asset,
+            )
+        data = ProductImageListSerializer(image).data
+        return Response(data=data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                name="files",
+                in_=openapi.IN_FORM,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_FILE),
+                required=True,
+                description=f"Images, at most {settings.IMAGE_UPLOAD_MAX_FILES}",
+            )
+        ],
+        request_body=None,
+        responses={status.HTTP_202_ACCEPTED: None},
+    )
+    @action(detail=False, methods=["post"])
+    def bulk(self, request, *args, **kwargs):
+        files = request.FILES.getlist("files")
+        product = get_object_or_404(
+            Product.objects.select_related("business"), pk=self.kwargs["id"]
+        )
+        if not product.business.owner == request.user:
+            raise serializers.ValidationError({"detail": "Not allowed"})
 
-        res = cloudinary.uploader.upload(file.file)
-        url = res.get("url")
+        if not files:
+            raise serializers.ValidationError({"files": "This field is required."})
+        if len(files) > settings.IMAGE_UPLOAD_MAX_FILES:
+            msg = f"At most {settings.IMAGE_UPLOAD_MAX_FILES} files per request"
+            raise serializers.ValidationError({"files": msg})
+
+        results = [{"name": str(file)} for file in files]
+        assets = create_image_assets(files)
+        with transaction.atomic():
+            images = []
+            for result, asset in zip(results, assets):
+                if isinstance(asset, ValueError):
+                    result["error"] = str(asset)
+                elif isinstance(asset, Exception):
+                    result["error"] = "Could not store the image"
+                else:
+                    image = ProductImage(
+                        product=product,
+                        name=result["name"],
+                        url=asset.renditions.get("full", ""),
+                        asset=asset,
+                    )
+                    images.append((result, image))
+            ProductImage.objects.bulk_create([image for _, image in images])
+            if images:
+                bump_catalog_version([product.business_id])
+
+        for result, image in images:
+            result["image"] = ProductImageListSerializer(image).data
 
-        image = ProductImage(product=product, name=str(file), url=url)
-        image.save()
-        data = ProductImageListSerializer(image).data
-        return Response(data=data, status=status.HTTP_200_OK)
+        return Response(
+            data={"results": results},
+            status=status.HTTP_202_ACCEPTED if images else status.HTTP_400_BAD_REQUEST,
+        )
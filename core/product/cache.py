@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_CACHE_TIMEOUT = 60 * 15
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:stats:hits"
+CATALOG_MISSES_KEY = "catalog:stats:misses"
+
+
+def get_business_version_key(business_id):
+    return f"catalog:business:{business_id}:version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so a version key that was evicted
+        # never comes back with a number that already has cached entries.
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def get_business_version(business_id):
+    return get_version(get_business_version_key(business_id))
+
+
+def bump_catalog_version(business_ids=()):
+    business_ids = set(business_ids)
+
+    def bump():
+        bump_version(CATALOG_VERSION_KEY)
+        for business_id in business_ids:
+            bump_version(get_business_version_key(business_id))
+
+    transaction.on_commit(bump)
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_list_cache_key(params):
+    query = "&".join(f"{key}={params.getlist(key)}" for key in sorted(params))
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f"catalog:list:{get_catalog_version()}:{digest}"
+
+
+def get_cached_list(key):
+    data = cache.get(key)
+    count(CATALOG_MISSES_KEY if data is None else CATALOG_HITS_KEY)
+    return data
+
+
+def set_cached_list(key, data):
+    cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+
+
+def get_cached_product(pk):
+    entry = cache.get(f"catalog:product:{pk}")
+    if entry and entry["version"] != get_business_version(entry["business_id"]):
+        entry = None
+
+    count(CATALOG_MISSES_KEY if entry is None else CATALOG_HITS_KEY)
+    return entry["data"] if entry else None
+
+
+def set_cached_product(product, data, version):
+    # `version` must be read before the product is, otherwise an update that
+    # commits in between would be cached under the newer version.
+    entry = {
+        "business_id": product.business_id,
+        "version": version,
+        "data": data,
+    }
+    cache.set(f"catalog:product:{product.pk}", entry, CATALOG_CACHE_TIMEOUT)
+
+
+def get_cache_stats():
+    hits = cache.get(CATALOG_HITS_KEY, 0)
+    misses = cache.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
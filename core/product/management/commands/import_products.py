@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.business.models import Business
+from core.config.choices import ImportConflictPolicy
+from core.product.services import CopyBackend, ProductImporter, read_product_csv
+
+
+class Command(BaseCommand):
+    help = "Load a supplier CSV into a business catalog with COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument("business_id", type=int)
+        parser.add_argument("path", help="CSV in the batch_upload column layout")
+        parser.add_argument(
+            "--on-conflict",
+            choices=ImportConflictPolicy.values,
+            default=settings.PRODUCT_IMPORT_CONFLICT_POLICY,
+            help="What to do with rows whose (name, product_no) already exists",
+        )
+        parser.add_argument("--chunk-size", type=int, default=50000)
+
+    def handle(self, *args, **options):
+        try:
+            business = Business.objects.get(pk=options["business_id"])
+        except Business.DoesNotExist:
+            raise CommandError(f"Business {options['business_id']} does not exist")
+
+        def report_progress(importer):
+            self.stdout.write(
+                f"{importer.processed} rows: {importer.created} created, "
+                f"{importer.updated} updated, {importer.skipped} skipped, "
+                f"{importer.failed} failed"
+            )
+
+        importer = ProductImporter(
+            business,
+            chunk_size=options["chunk_size"],
+            on_chunk=report_progress,
+            backend=CopyBackend(on_conflict=options["on_conflict"]),
+        )
+        with open(options["path"], "rb") as file:
+            importer.run(read_product_csv(file))
+
+        for error in importer.get_report()["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS("Import finished"))
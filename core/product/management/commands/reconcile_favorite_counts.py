@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.business.models import Business, BusinessFavorite
+from core.product.models import Product, ProductFavorite
+
+
+def get_actual_count(favorites, field):
+    count = (
+        favorites.filter(**{field: OuterRef("pk")})
+        .values(field)
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(count), 0)
+
+
+class Command(BaseCommand):
+    help = "Repair favorite_count drift on products and businesses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def reconcile(self, model, favorites, field, batch_size):
+        actual = get_actual_count(favorites, field)
+        last_pk = 0
+        repaired = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+
+            repaired += (
+                model.objects.filter(pk__in=pks)
+                .exclude(favorite_count=actual)
+                .update(favorite_count=actual)
+            )
+            last_pk = pks[-1]
+        return repaired
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        products = self.reconcile(
+            Product, ProductFavorite.objects.all(), "product", batch_size
+        )
+        businesses = self.reconcile(
+            Business, BusinessFavorite.objects.all(), "business", batch_size
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Repaired {products} products and {businesses} businesses"
+            )
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.product.models import Product
+
+
+class Command(BaseCommand):
+    help = "Backfill the full-text search document of existing products"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild every product, not only those without a search document",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        products = Product.objects.all()
+        if not options["all"]:
+            products = products.filter(search_vector__isnull=True)
+
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(
+                products.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+
+            updated += Product.objects.filter(pk__in=pks).update_search_vector()
+            last_pk = pks[-1]
+            self.stdout.write(f"Updated {updated} products")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} products updated"))
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0003_remove_product_quantity_alter_product_price"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["business", "name", "id"], name="product_business_name_idx"
+            ),
+        ),
+    ]
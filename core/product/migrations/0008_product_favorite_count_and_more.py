@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0007_productimportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="favorite_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE product_product SET favorite_count = favorites.count
+            FROM (
+                SELECT product_id, count(*) AS count
+                FROM product_productfavorite
+                GROUP BY product_id
+            ) AS favorites
+            WHERE favorites.product_id = product_product.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-favorite_count", "id"], name="product_favorite_count_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0008_product_favorite_count_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            DELETE FROM product_productfavorite AS duplicate
+            USING product_productfavorite AS kept
+            WHERE duplicate.user_id = kept.user_id
+                AND duplicate.product_id = kept.product_id
+                AND duplicate.id > kept.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE product_product SET favorite_count = (
+                SELECT count(*) FROM product_productfavorite
+                WHERE product_productfavorite.product_id = product_product.id
+            )
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
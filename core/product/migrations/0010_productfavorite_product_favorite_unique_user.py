@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0009_dedupe_product_favorites"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="productfavorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product"), name="product_favorite_unique_user"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-18 05:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("config", "0001_image_asset"),
+        ("product", "0010_productfavorite_product_favorite_unique_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="asset",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="product_images",
+                to="config.imageasset",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="url",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -1,8 +1,24 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
+from django.db import connection, models
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.utils import timezone
 
 from core.business.models import Business
-from core.config.choices import DiscountType, ProductCategory, ProductStatus
+from core.config.choices import (
+    DiscountType,
+    ImportJobStatus,
+    ProductCategory,
+    ProductStatus,
+)
 
 
 class Discount(models.Model):
@@ -13,6 +29,45 @@ class Discount(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+SEARCH_CONFIG = "english"
+
+
+class ProductQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        return self.update(
+            search_vector=(
+                SearchVector("name", weight="A", config=SEARCH_CONFIG)
+                + SearchVector("product_no", weight="B", config=SEARCH_CONFIG)
+                + SearchVector("category", weight="C", config=SEARCH_CONFIG)
+                + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+            )
+        )
+
+    def search(self, text):
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "id")
+        )
+
+    def suggest(self, text, limit):
+        return (
+            self.filter(
+                Q(name__trigram_word_similar=text)
+                | Q(product_no__trigram_word_similar=text)
+            )
+            .annotate(
+                similarity=Greatest(
+                    TrigramWordSimilarity(text, "name"),
+                    TrigramWordSimilarity(text, "product_no"),
+                )
+            )
+            .order_by("-similarity", "name")
+            .values("id", "name")[:limit]
+        )
+
+
 class Product(models.Model):
     business = models.ForeignKey(
         Business, on_delete=models.PROTECT, related_name="products"
@@ -35,11 +90,34 @@ class Product(models.Model):
     favourite = models.ManyToManyField(
         settings.AUTH_USER_MODEL, blank=True, related_name="user_favourite"
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorite_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         unique_together = ["name", "product_no"]
+        indexes = [
+            models.Index(
+                fields=["business", "name", "id"], name="product_business_name_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            models.Index(
+                fields=["-favorite_count", "id"], name="product_favorite_count_idx"
+            ),
+            GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["product_no"],
+                name="product_no_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -50,11 +128,52 @@ class ProductImage(models.Model):
         Product, on_delete=models.CASCADE, related_name="images"
     )
     name = models.CharField(max_length=100, blank=True)
-    url = models.CharField(max_length=255)
+    url = models.CharField(max_length=255, blank=True)
+    asset = models.ForeignKey(
+        "config.ImageAsset",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="product_images",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class ProductFavoriteQuerySet(models.QuerySet):
+    # One statement: remove the favorite if present, otherwise add it, and
+    # move the product's counter by the net change. Returns True when the
+    # product is now a favorite, False when it was removed and None when the
+    # product does not exist.
+    toggle_sql = """
+        WITH deleted AS (
+            DELETE FROM {favorite} WHERE user_id = %(user)s AND product_id = %(product)s
+            RETURNING id
+        ), inserted AS (
+            INSERT INTO {favorite} (user_id, product_id, created_at, updated_at)
+            SELECT %(user)s, id, now(), now() FROM {product}
+            WHERE id = %(product)s AND NOT EXISTS (SELECT 1 FROM deleted)
+            ON CONFLICT (user_id, product_id) DO NOTHING
+            RETURNING id
+        ), counted AS (
+            UPDATE {product} SET favorite_count = favorite_count
+                + (SELECT count(*) FROM inserted) - (SELECT count(*) FROM deleted)
+            WHERE id = %(product)s
+            RETURNING id
+        )
+        SELECT NOT EXISTS (SELECT 1 FROM deleted) FROM counted
+    """
+
+    def toggle(self, user, product_id):
+        sql = self.toggle_sql.format(
+            favorite=self.model._meta.db_table, product=Product._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {"user": user.pk, "product": product_id})
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
 class ProductFavorite(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.PROTECT, related_name="favorites_count"
@@ -66,3 +185,58 @@ class ProductFavorite(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductFavoriteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product"], name="product_favorite_unique_user"
+            )
+        ]
+
+
+class ProductImportJob(models.Model):
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="product_imports"
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="product_imports",
+    )
+    file = models.FileField(upload_to="imports/products/")
+    status = models.CharField(
+        max_length=10,
+        choices=ImportJobStatus.choices,
+        default=ImportJobStatus.PENDING,
+    )
+    total_rows = models.IntegerField(null=True)
+    rows_processed = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def throughput(self):
+        if not self.started_at:
+            return None
+
+        elapsed = (
+            (self.finished_at or timezone.now()) - self.started_at
+        ).total_seconds()
+        return round(self.rows_processed / elapsed, 2) if elapsed > 0 else None
+
+    @property
+    def eta(self):
+        if self.status != ImportJobStatus.PROCESSING or self.total_rows is None:
+            return None
+
+        throughput = self.throughput
+        if not throughput:
+            return None
+        return round(max(self.total_rows - self.rows_processed, 0) / throughput, 2)
@@ -4,13 +4,29 @@ from django.db.models.functions import JSONObject
 from rest_framework import serializers
 
 from core.business.serializers import BusinessBasicSerializer
-from core.product.models import Product, ProductFavorite, ProductImage
+from core.config.serializers import ImageAssetSerializer
+from core.product.models import (
+    Product,
+    ProductFavorite,
+    ProductImage,
+    ProductImportJob,
+)
 
 
 class ProductImageListSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+    asset = ImageAssetSerializer(read_only=True)
+
     class Meta:
         model = ProductImage
-        fields = ["id", "name", "url", "created_at"]
+        fields = ["id", "name", "url", "asset", "created_at"]
+
+    def get_url(self, obj):
+        # An image added while its shared asset was finishing may have missed
+        # the update that fills in `url`.
+        if not obj.url and obj.asset is not None:
+            return obj.asset.renditions.get("full", "")
+        return obj.url
 
 
 class ProductQtySerializer(serializers.Serializer):
@@ -19,7 +35,7 @@ class ProductQtySerializer(serializers.Serializer):
 
 class ProductListSerializer(serializers.ModelSerializer):
     business = BusinessBasicSerializer()
-    images = serializers.SerializerMethodField()
+    images = ProductImageListSerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
@@ -36,10 +52,20 @@ class ProductListSerializer(serializers.ModelSerializer):
             "images",
         ]
 
-    def get_images(self, obj):
-        return ProductImage.objects.filter(product=obj).values(
-            "id", "name", "url", "created_at"
-        )
+
+class ProductPopularSerializer(ProductListSerializer):
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ["favorite_count"]
+
+
+class SuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class ProductSuggestionListSerializer(serializers.Serializer):
+    products = SuggestionSerializer(many=True)
+    businesses = SuggestionSerializer(many=True)
 
 
 class ProductBasicSerializer(serializers.ModelSerializer):
@@ -77,14 +103,55 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             "price",
             "tax",
         ]
+        # The view checks (name, product_no) itself so a duplicate keeps its
+        # "detail" error.
+        validators = []
 
     def to_representation(self, instance):
         return ProductListSerializer(instance=instance, context=self.context).data
 
 
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = [
+            "name",
+            "product_no",
+            "description",
+            "category",
+            "unit",
+            "price",
+            "tax",
+        ]
+        # (name, product_no) uniqueness is checked a chunk at a time by the
+        # importer, not with one query per row.
+        validators = []
+
+
 class ProductFavoriteListSerializer(serializers.ModelSerializer):
     product = ProductBasicSerializer()
 
     class Meta:
         model = ProductFavorite
         fields = ["product"]
+
+
+class ProductImportJobSerializer(serializers.ModelSerializer):
+    throughput = serializers.FloatField(read_only=True)
+    eta = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ProductImportJob
+        fields = [
+            "id",
+            "status",
+            "total_rows",
+            "rows_processed",
+            "rows_failed",
+            "throughput",
+            "eta",
+            "errors",
+            "started_at",
+            "finished_at",
+            "created_at",
+        ]
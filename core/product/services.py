@@ -0,0 +1,293 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+
+from rest_framework import serializers
+
+from core.cart.models import Cart
+from core.config.choices import ImportConflictPolicy, ProductStatus
+from core.product.cache import bump_catalog_version
+from core.product.models import Product
+from core.product.serializers import ProductImportSerializer
+
+PRODUCT_CSV_COLUMNS = [
+    "name",
+    "product_no",
+    "description",
+    "category",
+    "unit",
+    "price",
+    "tax",
+]
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_product_csv(file):
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    next(reader, None)
+    for line_no, row in enumerate(reader, start=2):
+        if any(row):
+            yield line_no, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_products_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(PRODUCT_CSV_COLUMNS)
+    rows = queryset.values_list(*PRODUCT_CSV_COLUMNS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    for chunk in chunked(rows, EXPORT_CHUNK_SIZE):
+        yield "".join(writer.writerow(row) for row in chunk)
+
+
+def export_products_ndjson(queryset):
+    rows = queryset.values("id", *PRODUCT_CSV_COLUMNS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    for chunk in chunked(rows, EXPORT_CHUNK_SIZE):
+        yield "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in chunk)
+
+
+class BulkCreateBackend:
+    merges_existing = False
+
+    @transaction.atomic
+    def write(self, business, rows):
+        try:
+            with transaction.atomic():
+                products = Product.objects.bulk_create(
+                    [Product(business=business, **data) for data in rows]
+                )
+            conflicts = []
+        except IntegrityError:
+            # Another writer added some of these products after they were
+            # checked; retry one by one so only those rows fail.
+            products, conflicts = self.create_each(business, rows)
+
+        Product.objects.filter(
+            pk__in=[product.pk for product in products]
+        ).update_search_vector()
+        bump_catalog_version([business.pk])
+        return {"created": len(products), "updated": 0, "conflicts": conflicts}
+
+    def create_each(self, business, rows):
+        products = []
+        conflicts = []
+        for index, data in enumerate(rows):
+            try:
+                with transaction.atomic():
+                    products.append(Product.objects.create(business=business, **data))
+            except IntegrityError:
+                conflicts.append(index)
+        return products, conflicts
+
+
+# Loads rows into a temporary staging table with COPY FROM STDIN and merges
+# them into product_product with a single INSERT ... ON CONFLICT.
+class CopyBackend:
+    merges_existing = True
+
+    create_staging_sql = """
+        CREATE TEMPORARY TABLE product_import_staging (
+            name varchar(255),
+            product_no varchar(255),
+            description text,
+            category varchar(255),
+            unit varchar(50),
+            price double precision,
+            tax numeric(4, 2)
+        ) ON COMMIT DROP
+    """
+    copy_sql = (
+        f"COPY product_import_staging ({', '.join(PRODUCT_CSV_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    merge_sql = """
+        INSERT INTO product_product (
+            business_id, name, product_no, description, category, unit, price,
+            tax, status, favorite_count, created_at, updated_at
+        )
+        SELECT
+            %(business_id)s, name, product_no, description, category, unit,
+            price, tax, %(status)s, 0, now(), now()
+        FROM product_import_staging
+        ON CONFLICT (name, product_no) {action}
+        RETURNING id, (xmax = 0) AS created
+    """
+    conflict_actions = {
+        ImportConflictPolicy.IGNORE: "DO NOTHING",
+        # Never take over a product that belongs to another business.
+        ImportConflictPolicy.UPDATE: """
+            DO UPDATE SET
+                description = EXCLUDED.description,
+                category = EXCLUDED.category,
+                unit = EXCLUDED.unit,
+                price = EXCLUDED.price,
+                tax = EXCLUDED.tax,
+                updated_at = EXCLUDED.updated_at
+            WHERE product_product.business_id = EXCLUDED.business_id
+        """,
+    }
+
+    def __init__(self, on_conflict=ImportConflictPolicy.IGNORE):
+        self.on_conflict = ImportConflictPolicy(on_conflict)
+
+    def get_copy_buffer(self, rows):
+        buffer = io.StringIO()
+        # Quote every value so empty strings are not loaded as NULL.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for data in rows:
+            writer.writerow([data[column] for column in PRODUCT_CSV_COLUMNS])
+        buffer.seek(0)
+        return buffer
+
+    @transaction.atomic
+    def write(self, business, rows):
+        action = self.conflict_actions[self.on_conflict]
+        with connection.cursor() as cursor:
+            cursor.execute(self.create_staging_sql)
+            cursor.copy_expert(self.copy_sql, self.get_copy_buffer(rows))
+            cursor.execute(
+                self.merge_sql.format(action=action),
+                {"business_id": business.pk, "status": ProductStatus.AVAILABLE},
+            )
+            results = cursor.fetchall()
+            # ON COMMIT DROP only fires when the outermost transaction ends;
+            # inside a caller's atomic block the next chunk would find it.
+            cursor.execute("DROP TABLE product_import_staging")
+
+        Product.objects.filter(pk__in=[pk for pk, _ in results]).update_search_vector()
+        updated = [pk for pk, is_created in results if not is_created]
+        if updated:
+            Cart.objects.filter(orders__product__in=updated).refresh_totals()
+        bump_catalog_version([business.pk])
+        created = len(results) - len(updated)
+        return {"created": created, "updated": len(results) - created}
+
+
+class ProductImporter:
+    def __init__(
+        self, business, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None, backend=None
+    ):
+        self.business = business
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.backend = backend or BulkCreateBackend()
+        self.serializer = ProductImportSerializer()
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self._seen = set()
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.skipped + self.failed
+
+    def get_report(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+        }
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.chunk_size):
+            self.import_chunk(chunk)
+            if self.on_chunk:
+                self.on_chunk(self)
+        return self
+
+    def import_chunk(self, chunk):
+        rows = self.validate_chunk(chunk)
+        if not rows:
+            return
+
+        counts = self.backend.write(self.business, [data for _, data in rows])
+        conflicts = counts.get("conflicts", [])
+        for index in conflicts:
+            self.add_error(rows[index][0], {"detail": "Product already exists"})
+        self.created += counts["created"]
+        self.updated += counts["updated"]
+        self.skipped += (
+            len(rows) - counts["created"] - counts["updated"] - len(conflicts)
+        )
+
+    def validate_chunk(self, chunk):
+        candidates = []
+        for line_no, row in chunk:
+            data = self.validate_row(line_no, row)
+            if data is None:
+                continue
+
+            key = (data["name"], data["product_no"])
+            if key in self._seen:
+                self.add_error(line_no, {"detail": "Duplicate product in file"})
+                continue
+
+            self._seen.add(key)
+            candidates.append((line_no, data))
+
+        if self.backend.merges_existing:
+            return candidates
+
+        existing = self.get_existing_keys(data for _, data in candidates)
+        rows = []
+        for line_no, data in candidates:
+            if (data["name"], data["product_no"]) in existing:
+                self.add_error(line_no, {"detail": "Product already exists"})
+                continue
+            rows.append((line_no, data))
+        return rows
+
+    def validate_row(self, line_no, row):
+        if len(row) < len(PRODUCT_CSV_COLUMNS) - 1:
+            msg = f"Expected {len(PRODUCT_CSV_COLUMNS)} columns, got {len(row)}"
+            self.add_error(line_no, {"detail": msg})
+            return None
+
+        data = dict(zip(PRODUCT_CSV_COLUMNS, row))
+        data["tax"] = data.get("tax") or 0
+        try:
+            return self.serializer.run_validation(data)
+        except serializers.ValidationError as e:
+            self.add_error(line_no, e.detail)
+            return None
+
+    def get_existing_keys(self, rows):
+        rows = list(rows)
+        if not rows:
+            return set()
+
+        names = {data["name"] for data in rows}
+        numbers = {data["product_no"] for data in rows}
+        return set(
+            Product.objects.filter(name__in=names, product_no__in=numbers).values_list(
+                "name", "product_no"
+            )
+        )
+
+    def add_error(self, line_no, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "errors": errors})
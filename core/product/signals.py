@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.business.models import Business
+from core.config.media import image_asset_ready
+from core.product.cache import bump_catalog_version
+from core.product.models import Discount, Product, ProductImage
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_catalog_version([instance.business_id])
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    business_ids = Product.objects.filter(pk=instance.product_id).values_list(
+        "business_id", flat=True
+    )
+    bump_catalog_version(business_ids)
+
+
+@receiver([post_save, pre_delete], sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+    business_ids = (
+        Product.objects.filter(discount=instance)
+        .values_list("business_id", flat=True)
+        .distinct()
+    )
+    bump_catalog_version(business_ids)
+
+
+@receiver([post_save, post_delete], sender=Business)
+def business_changed(sender, instance, **kwargs):
+    bump_catalog_version([instance.pk])
+
+
+@receiver(image_asset_ready)
+def product_image_ready(sender, asset, **kwargs):
+    images = ProductImage.objects.filter(asset=asset)
+    business_ids = list(
+        images.values_list("product__business_id", flat=True).distinct()
+    )
+    images.update(url=asset.renditions["full"], updated_at=timezone.now())
+    bump_catalog_version(business_ids)
@@ -0,0 +1,54 @@
+from celery import shared_task
+from django.utils import timezone
+
+from core.config.choices import ImportJobStatus
+from core.product.models import ProductImportJob
+from core.product.services import ProductImporter, read_product_csv
+
+
+def count_rows(job):
+    with job.file.open("rb") as file:
+        return sum(1 for _ in read_product_csv(file.file))
+
+
+@shared_task
+def process_product_import(job_id):
+    job = ProductImportJob.objects.select_related("business").get(pk=job_id)
+    jobs = ProductImportJob.objects.filter(pk=job.pk)
+
+    # A redelivered message must not import the same file twice.
+    if not jobs.filter(status=ImportJobStatus.PENDING).update(
+        status=ImportJobStatus.PROCESSING, started_at=timezone.now()
+    ):
+        return
+
+    def save_progress(importer):
+        jobs.update(
+            rows_processed=importer.processed,
+            rows_failed=importer.failed,
+            updated_at=timezone.now(),
+        )
+
+    importer = ProductImporter(job.business, on_chunk=save_progress)
+    try:
+        jobs.update(total_rows=count_rows(job))
+        with job.file.open("rb") as file:
+            importer.run(read_product_csv(file.file))
+    except Exception as e:
+        jobs.update(
+            status=ImportJobStatus.FAILED,
+            rows_processed=importer.processed,
+            rows_failed=importer.failed,
+            errors=importer.get_report()["errors"]
+            + [{"line": None, "errors": {"detail": str(e)}}],
+            finished_at=timezone.now(),
+        )
+        raise
+
+    jobs.update(
+        status=ImportJobStatus.COMPLETED,
+        rows_processed=importer.processed,
+        rows_failed=importer.failed,
+        errors=importer.get_report()["errors"],
+        finished_at=timezone.now(),
+    )
@@ -1,3 +1,804 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.accounts.models import User
+from core.business.models import Business
+from core.config.choices import (
+    DiscountType,
+    ImageStatus,
+    ImportConflictPolicy,
+    ImportJobStatus,
+    UserType,
+)
+from core.config.media import RENDITIONS
+from core.config.models import ImageAsset
+from core.product.cache import get_cache_stats
+from core.product.models import (
+    Discount,
+    Product,
+    ProductFavorite,
+    ProductImage,
+    ProductImportJob,
+)
+from core.product.services import (
+    PRODUCT_CSV_COLUMNS,
+    CopyBackend,
+    ProductImporter,
+    read_product_csv,
+)
+from core.product.tasks import process_product_import
+
+
+def create_business(email="owner@example.com", name="Corner Shop"):
+    owner = User.objects.create_user(
+        email=email, password="pass1234", type=UserType.SHOP_OWNER
+    )
+    return Business.objects.create(
+        owner=owner,
+        name=name,
+        phone="08000000000",
+        address="1 Main Street",
+        established=datetime.date(2020, 1, 1),
+    )
+
+
+def create_products(business, count, images_per_product=2, start=0):
+    discount = Discount.objects.create(discount_type=DiscountType.PERCENTAGE, value=10)
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                business=business,
+                name=f"Product {i}",
+                product_no=f"P-{i}",
+                discount=discount,
+                price=100 + i,
+            )
+            for i in range(start, start + count)
+        ]
+    )
+    ProductImage.objects.bulk_create(
+        [
+            ProductImage(
+                product=product,
+                name=f"{product.product_no}-{j}.png",
+                url=f"https://img.example.com/{product.product_no}-{j}.png",
+            )
+            for product in products
+            for j in range(images_per_product)
+        ]
+    )
+    return products
+
+
+class ProductBasicViewSetQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.products = create_products(cls.business, 5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/products")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(response.data[0]["images"]), 2)
+        self.assertEqual(response.data[0]["business"]["name"], "Corner Shop")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            business = create_business("other@example.com", "Other Shop")
+        create_products(business, 50, 3, 5)
+        with self.assertNumQueries(2):
+            response = self.client.get("/products")
+
+        self.assertEqual(len(response.data), 55)
+
+    def test_retrieve_query_count(self):
+        product = self.products[0]
+
+        # The business id, then the product with its images.
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/products/{product.pk}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], product.pk)
+        self.assertEqual(
+            [image["name"] for image in response.data["images"]],
+            ["P-0-0.png", "P-0-1.png"],
+        )
+
+
+class ProductBasicViewSetCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.other_business = create_business("other@example.com", "Other Shop")
+        cls.product = create_products(cls.business, 2)[0]
+        cls.other_product = create_products(cls.other_business, 2, start=2)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_list_is_cached_until_the_catalog_changes(self):
+        self.client.get("/products")
+        with self.assertNumQueries(0):
+            response = self.client.get("/products")
+        self.assertEqual(len(response.data), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.product, name="new.png", url="u")
+
+        response = self.client.get("/products")
+        product = next(p for p in response.data if p["id"] == self.product.pk)
+        self.assertEqual(len(product["images"]), 3)
+
+        stats = get_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_conditional_get_short_circuits_before_serializing(self):
+        response = self.client.get("/products")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        response = self.client.get("/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_owner_list_conditional_get(self):
+        self.client.force_authenticate(self.business.owner)
+        url = f"/businesses/{self.business.pk}/products"
+        response = self.client.get(url)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        # A delete never moves Max(updated_at) forward but must still count.
+        Product.objects.filter(pk=self.product.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_is_invalidated_per_business(self):
+        url = f"/products/{self.product.pk}"
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_product.price = 1
+            self.other_product.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.client.force_authenticate(self.business.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                f"/businesses/{self.business.pk}/products/{self.product.pk}",
+                {"price": 42},
+                format="json",
+            )
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["price"], 42)
+
+
+class ProductFavoriteToggleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_products(create_business(), 1)[0]
+        cls.customer = User.objects.create_user(
+            email="customer@example.com", password="pass1234", type=UserType.CUSTOMER
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = f"/products/{self.product.pk}/toggle_favorite"
+
+    def test_toggle_adds_and_removes_in_one_query(self):
+        for expected in [1, 0, 1]:
+            with self.assertNumQueries(1):
+                response = self.client.post(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.favorite_count, expected)
+            self.assertEqual(ProductFavorite.objects.count(), expected)
+
+    def test_toggle_unknown_product(self):
+        response = self.client.post("/products/0/toggle_favorite")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ProductFavorite.objects.exists())
+
+
+class ProductSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.business.owner)
+
+    def test_update_of_a_missing_product_is_not_found(self):
+        product = self.create("Walnut watch")
+        other = create_business("other@example.com", "Other Shop")
+
+        for url in [
+            f"/businesses/{self.business.pk}/products/{product.pk + 1}",
+            f"/businesses/{other.pk}/products/{product.pk}",
+            f"/businesses/{other.pk + 1}/products/{product.pk}",
+        ]:
+            response = self.client.put(url, {"name": "Oak clock"}, format="json")
+            self.assertEqual(response.status_code, 404)
+
+    def search(self, text):
+        return list(Product.objects.search(text).values_list("name", flat=True))
+
+    def create(self, name, description=""):
+        data = {
+            "name": name,
+            "product_no": name[:3].upper(),
+            "description": description,
+        }
+        url = f"/businesses/{self.business.pk}/products"
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return Product.objects.get(name=name)
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.create("Leather strap", "Fits the walnut watch")
+        self.create("Walnut watch", "Hand finished")
+
+        self.assertEqual(self.search("walnut watch"), ["Walnut watch", "Leather strap"])
+        response = APIClient().get("/products", {"search": "walnut"})
+        self.assertEqual(
+            [p["name"] for p in response.data], ["Walnut watch", "Leather strap"]
+        )
+
+    def test_vector_follows_updates(self):
+        product = self.create("Walnut watch")
+
+        url = f"/businesses/{self.business.pk}/products/{product.pk}"
+        response = self.client.put(url, {"name": "Oak clock"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.search("walnut"), [])
+        self.assertEqual(self.search("clock"), ["Oak clock"])
+
+    def test_vector_is_set_by_both_import_backends(self):
+        rows = [["Cedar chair", "C-1", "", "furniture", "", "40", "0"]]
+        ProductImporter(self.business).run(read_product_csv(io.BytesIO(make_csv(rows))))
+        rows = [["Cedar desk", "C-2", "", "furniture", "", "90", "0"]]
+        ProductImporter(self.business, backend=CopyBackend()).run(
+            read_product_csv(io.BytesIO(make_csv(rows)))
+        )
+
+        self.assertEqual(sorted(self.search("cedar")), ["Cedar chair", "Cedar desk"])
+
+
+class ProductSuggestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business(name="Walnut Crafts")
+        Product.objects.bulk_create(
+            [
+                Product(business=cls.business, name=name, product_no=no, price=1)
+                for name, no in [
+                    ("Walnut watch", "WW-1"),
+                    ("Walnut bowl", "WB-2"),
+                    ("Steel spoon", "SS-3"),
+                ]
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def suggest(self, **params):
+        response = self.client.get("/products/suggest", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_suggests_products_and_businesses_for_a_partial_word(self):
+        data = self.suggest(q="walnu")
+
+        self.assertEqual(
+            {p["name"] for p in data["products"]}, {"Walnut watch", "Walnut bowl"}
+        )
+        self.assertEqual([b["name"] for b in data["businesses"]], ["Walnut Crafts"])
+        self.assertEqual(
+            [p["name"] for p in self.suggest(q="ss-3")["products"]], ["Steel spoon"]
+        )
+
+    def test_normalized_query_is_served_from_the_cache(self):
+        first = self.suggest(q="Walnut ")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest(q="  walnut"), first)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.suggest(q="walnut", limit=1)["products"]), 1)
+
+    def test_empty_and_invalid_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest(q=" "), {"products": [], "businesses": []})
+        response = self.client.get("/products/suggest", {"q": "walnut", "limit": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.other = create_business(email="other@example.com", name="Other Shop")
+        cls.products = create_products(cls.business, 5, images_per_product=0)
+        create_products(cls.other, 2, images_per_product=0, start=10)
+        Product.objects.filter(pk=cls.products[0].pk).update(
+            description='Comma, "quoted"\nand multiline'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.business.owner)
+
+    def export(self, file_type, business=None):
+        business = business or self.business
+        url = f"/businesses/{business.pk}/products/export"
+        with mock.patch("core.product.services.EXPORT_CHUNK_SIZE", 2):
+            response = self.client.get(url, {"file_type": file_type})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            return response, b"".join(response.streaming_content)
+
+    def test_csv_export_round_trips_through_the_importer(self):
+        response, content = self.export("csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn(
+            f"products-{self.business.pk}.csv", response["Content-Disposition"]
+        )
+        rows = list(read_product_csv(io.BytesIO(content)))
+        self.assertEqual([row[1] for _, row in rows], [f"P-{i}" for i in range(5)])
+        self.assertEqual(rows[0][1][2], 'Comma, "quoted"\nand multiline')
+        self.assertTrue(content.startswith(",".join(PRODUCT_CSV_COLUMNS).encode()))
+
+    def test_ndjson_export(self):
+        response, content = self.export("ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([line["id"] for line in lines], [p.pk for p in self.products])
+        self.assertEqual(set(lines[0]), {"id", *PRODUCT_CSV_COLUMNS})
+
+    def test_export_is_scoped_to_the_owners_business(self):
+        _, content = self.export("ndjson", business=self.other)
+        self.assertEqual(content, b"")
+
+        url = f"/businesses/{self.business.pk}/products/export"
+        response = self.client.get(url, {"file_type": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductPopularityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.products = create_products(cls.business, 4, images_per_product=0)
+        cls.customers = [
+            User.objects.create_user(
+                email=f"customer{i}@example.com",
+                password="pass1234",
+                type=UserType.CUSTOMER,
+            )
+            for i in range(3)
+        ]
+
+    def test_popular_orders_by_favorites_then_id(self):
+        first, second, third, fourth = self.products
+        for customer in self.customers[:2]:
+            ProductFavorite.objects.toggle(customer, third.pk)
+        ProductFavorite.objects.toggle(self.customers[0], second.pk)
+        ProductFavorite.objects.toggle(self.customers[1], fourth.pk)
+
+        response = APIClient().get("/products/popular", {"limit": 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(p["id"], p["favorite_count"]) for p in response.data],
+            [(third.pk, 2), (second.pk, 1), (fourth.pk, 1)],
+        )
+
+    def test_owner_cannot_write_favorite_count(self):
+        client = APIClient()
+        client.force_authenticate(self.business.owner)
+        url = f"/businesses/{self.business.pk}/products"
+
+        response = client.post(
+            url,
+            {"name": "Teapot", "product_no": "T-1", "favorite_count": 500},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response = client.put(
+            f"{url}/{self.products[0].pk}",
+            {"price": 5, "favorite_count": 500},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            dict(Product.objects.values_list("name", "favorite_count")),
+            {name: 0 for name in ["Teapot", *(p.name for p in self.products)]},
+        )
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).price, 5)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        first, second = self.products[:2]
+        ProductFavorite.objects.toggle(self.customers[0], first.pk)
+        Product.objects.filter(pk=first.pk).update(favorite_count=7)
+        Product.objects.filter(pk=second.pk).update(favorite_count=3)
+        Business.objects.filter(pk=self.business.pk).update(favorite_count=2)
+
+        stdout = io.StringIO()
+        call_command("reconcile_favorite_counts", "--batch-size=2", stdout=stdout)
+
+        self.assertIn("Repaired 2 products and 1 businesses", stdout.getvalue())
+        self.assertEqual(
+            dict(Product.objects.values_list("pk", "favorite_count")),
+            {product.pk: int(product == first) for product in self.products},
+        )
+        self.business.refresh_from_db()
+        self.assertEqual(self.business.favorite_count, 0)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+    CELERY_BROKER_URL="memory://",
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class ProductImportJobTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        create_products(cls.business, 1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.business.owner)
+
+    def upload(self):
+        rows = [",".join(PRODUCT_CSV_COLUMNS)]
+        rows += [f"Item {i},I-{i},,grocery,kg,{i},0" for i in range(25)]
+        rows += ["Product 0,P-0,,random,,1,0", "Broken,B-1,,random,,not a price,0"]
+        file = SimpleUploadedFile("products.csv", "\n".join(rows).encode())
+        url = f"/businesses/{self.business.pk}/products/batch_upload?async=true"
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {"file": file}, format="multipart")
+
+    def test_async_upload_is_processed_by_the_task(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], ImportJobStatus.PENDING)
+
+        url = (
+            f"/businesses/{self.business.pk}/products/"
+            f"import_jobs/{response.data['id']}"
+        )
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], ImportJobStatus.COMPLETED)
+        self.assertEqual(response.data["total_rows"], 27)
+        self.assertEqual(response.data["rows_processed"], 27)
+        self.assertEqual(response.data["rows_failed"], 2)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [27, 28])
+        self.assertEqual(Product.objects.filter(category="grocery").count(), 25)
+
+    def test_task_ignores_jobs_that_already_ran(self):
+        response = self.upload()
+        job = ProductImportJob.objects.get(pk=response.data["id"])
+
+        process_product_import.apply(args=(job.pk,))
+
+        self.assertEqual(Product.objects.filter(category="grocery").count(), 25)
+
+
+def create_image_file(name="photo.jpg", size=(2000, 1000)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+    IMAGE_STORAGE_BACKEND="core.config.media.LocalImageStorage",
+    CELERY_BROKER_URL="memory://",
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class ProductImagePipelineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.product = create_products(cls.business, 1, images_per_product=0)[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.business.owner)
+
+    def test_upload_returns_pending_image_resolved_by_the_task(self):
+        url = f"/products/{self.product.pk}/images"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url, {"file": create_image_file()}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["url"], "")
+        self.assertEqual(response.data["asset"]["status"], ImageStatus.PENDING)
+
+        image = ProductImage.objects.select_related("asset").get()
+        renditions = image.asset.renditions
+        self.assertEqual(image.asset.status, ImageStatus.READY)
+        self.assertEqual(set(renditions), set(RENDITIONS))
+        self.assertEqual(image.url, renditions["full"])
+
+        for name, (width, height) in RENDITIONS.items():
+            path = renditions[name].removeprefix(settings.MEDIA_URL)
+            with Image.open(os.path.join(settings.MEDIA_ROOT, path)) as rendition:
+                self.assertLessEqual(rendition.width, width)
+                self.assertLessEqual(rendition.height, height)
+                self.assertEqual(rendition.width, 2 * rendition.height)
+
+        response = self.client.get(f"/products/{self.product.pk}")
+        self.assertEqual(response.data["images"][0]["url"], renditions["full"])
+
+    def test_upload_rejects_files_that_are_not_images(self):
+        url = f"/products/{self.product.pk}/images"
+        file = SimpleUploadedFile("notes.jpg", b"not an image")
+        response = self.client.post(url, {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["file"], "Upload a valid image")
+        self.assertFalse(ProductImage.objects.exists())
+        self.assertFalse(ImageAsset.objects.exists())
+
+    def test_bulk_upload_reports_each_file(self):
+        url = f"/products/{self.product.pk}/images/bulk"
+        files = [create_image_file(f"photo-{i}.jpg", (400, 300 + i)) for i in range(3)]
+        files += [
+            SimpleUploadedFile("notes.jpg", b"not an image"),
+            create_image_file("photo-0.jpg"),
+            create_image_file("copy.jpg", (400, 300)),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"files": files}, format="multipart")
+
+        self.assertEqual(response.status_code, 202)
+        results = response.data["results"]
+        self.assertEqual(
+            [r["name"] for r in results],
+            [
+                "photo-0.jpg",
+                "photo-1.jpg",
+                "photo-2.jpg",
+                "notes.jpg",
+                "photo-0.jpg",
+                "copy.jpg",
+            ],
+        )
+        self.assertEqual(results[3]["error"], "Upload a valid image")
+        self.assertEqual(
+            results[5]["image"]["asset"]["id"], results[0]["image"]["asset"]["id"]
+        )
+
+        images = ProductImage.objects.filter(product=self.product).select_related(
+            "asset"
+        )
+        self.assertEqual(len(images), 5)
+        self.assertEqual(ImageAsset.objects.count(), 4)
+        for image in images:
+            self.assertEqual(image.asset.status, ImageStatus.READY)
+            self.assertEqual(image.url, image.asset.renditions["full"])
+
+    def test_identical_upload_reuses_the_stored_asset(self):
+        url = f"/products/{self.product.pk}/images"
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(
+                url, {"file": create_image_file("front.jpg")}, format="multipart"
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.client.post(
+                url, {"file": create_image_file("front-copy.jpg")}, format="multipart"
+            )
+
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.data["asset"]["id"], first.data["asset"]["id"])
+        self.assertEqual(second.data["asset"]["status"], ImageStatus.READY)
+        self.assertEqual(second.data["url"], second.data["asset"]["renditions"]["full"])
+        self.assertEqual(ImageAsset.objects.count(), 1)
+        originals = os.listdir(os.path.join(settings.MEDIA_ROOT, "images/originals"))
+        self.assertNotIn("front-copy.jpg", originals)
+
+    def test_bulk_upload_with_no_valid_files(self):
+        url = f"/products/{self.product.pk}/images/bulk"
+        file = SimpleUploadedFile("notes.jpg", b"not an image")
+        response = self.client.post(url, {"files": [file]}, format="multipart")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["results"][0]["error"], "Upload a valid image")
+        self.assertFalse(ProductImage.objects.exists())
+
+
+def make_csv(rows):
+    lines = [",".join(PRODUCT_CSV_COLUMNS)] + [",".join(row) for row in rows]
+    return "\n".join(lines).encode()
+
+
+class ProductImporterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        create_products(cls.business, 1, images_per_product=0)
+
+    def run_import(self, rows):
+        importer = ProductImporter(self.business, chunk_size=3)
+        return importer.run(read_product_csv(io.BytesIO(make_csv(rows))))
+
+    def test_reports_invalid_duplicate_and_existing_rows(self):
+        importer = self.run_import(
+            [
+                ["Tea", "T-1", "", "grocery", "box", "3", "0"],
+                ["Tea", "T-1", "", "grocery", "box", "3", "0"],
+                ["Product 0", "P-0", "", "random", "", "1", "0"],
+                ["Rice", "R-1", "", "grocery", "kg", "not a price", "0"],
+                ["Short", "S-1"],
+                ["Beans", "B-1", "", "grocery", "kg", "2", ""],
+            ]
+        )
+
+        report = importer.get_report()
+        self.assertEqual((report["created"], report["failed"]), (2, 4))
+        self.assertEqual([e["line"] for e in report["errors"]], [3, 4, 5, 6])
+        self.assertEqual(
+            report["errors"][1]["errors"], {"detail": "Product already exists"}
+        )
+        tea = Product.objects.get(product_no="T-1")
+        self.assertEqual((tea.business, tea.unit, tea.price), (self.business, "box", 3))
+
+    def test_product_added_after_the_check_fails_only_its_row(self):
+        # As if another import inserted P-0 between the check and the insert.
+        with mock.patch.object(
+            ProductImporter, "get_existing_keys", return_value=set()
+        ):
+            importer = self.run_import(
+                [
+                    ["Tea", "T-1", "", "grocery", "box", "3", "0"],
+                    ["Product 0", "P-0", "", "random", "", "1", "0"],
+                    ["Beans", "B-1", "", "grocery", "kg", "2", "0"],
+                ]
+            )
+
+        report = importer.get_report()
+        self.assertEqual((report["created"], report["failed"]), (2, 1))
+        self.assertEqual(report["errors"][0]["line"], 3)
+        self.assertEqual(
+            set(Product.objects.values_list("product_no", flat=True)),
+            {"P-0", "T-1", "B-1"},
+        )
+
+
+class ProductCopyImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.other = create_business(email="other@example.com", name="Other Shop")
+        create_products(cls.business, 1, images_per_product=0)
+        Product.objects.create(
+            business=cls.other, name="Other", product_no="O-1", price=5
+        )
+
+    def run_import(self, rows, on_conflict=ImportConflictPolicy.IGNORE, **kwargs):
+        importer = ProductImporter(
+            self.business, backend=CopyBackend(on_conflict=on_conflict), **kwargs
+        )
+        return importer.run(read_product_csv(io.BytesIO(make_csv(rows))))
+
+    def test_ignore_keeps_existing_products(self):
+        rows = [["Product 0", "P-0", "", "random", "", "999", "0"]]
+        rows += [["New", "N-1", "fresh", "grocery", "kg", "1.5", "0"]]
+        importer = self.run_import(rows)
+
+        self.assertEqual(
+            (importer.created, importer.updated, importer.skipped), (1, 0, 1)
+        )
+        self.assertEqual(Product.objects.get(product_no="P-0").price, 100)
+        new = Product.objects.get(product_no="N-1")
+        self.assertEqual(
+            (new.business, new.unit, new.price), (self.business, "kg", 1.5)
+        )
+
+    def test_update_merges_existing_products(self):
+        rows = [["Product 0", "P-0", "", "books and literature", "", "999", "0"]]
+        rows += [["New", "N-1", "", "random", "", "1", "0"]]
+        importer = self.run_import(rows, ImportConflictPolicy.UPDATE)
+
+        self.assertEqual(
+            (importer.created, importer.updated, importer.skipped), (1, 1, 0)
+        )
+        product = Product.objects.get(product_no="P-0")
+        self.assertEqual(
+            (product.price, product.category), (999, "books and literature")
+        )
+
+    def test_update_never_takes_over_another_business(self):
+        rows = [["Other", "O-1", "", "random", "", "1", "0"]]
+        importer = self.run_import(rows, ImportConflictPolicy.UPDATE)
+
+        self.assertEqual(
+            (importer.created, importer.updated, importer.skipped), (0, 0, 1)
+        )
+        product = Product.objects.get(product_no="O-1")
+        self.assertEqual((product.business, product.price), (self.other, 5))
+
+    def test_chunks_inside_an_outer_transaction(self):
+        rows = [
+            [f"Item {i}", f"I-{i}", "", "random", "", str(i), "0"] for i in range(5)
+        ]
+        with transaction.atomic():
+            importer = self.run_import(rows, chunk_size=2)
+
+        self.assertEqual(importer.created, 5)
+        self.assertEqual(Product.objects.filter(product_no__startswith="I-").count(), 5)
+
+    def test_import_products_command(self):
+        rows = [["Product 0", "P-0", "", "random", "", "50", "0"]]
+        rows += [
+            [f"Item {i}", f"I-{i}", "", "random", "", str(i), "0"] for i in range(3)
+        ]
+        rows += [["Broken", "B-1", "", "random", "", "not a price", "0"]]
+        with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+            file.write(make_csv(rows))
+            file.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command(
+                "import_products",
+                self.business.pk,
+                file.name,
+                "--on-conflict=update",
+                "--chunk-size=2",
+                stdout=stdout,
+                stderr=stderr,
+            )
+
+        self.assertIn(
+            "5 rows: 3 created, 1 updated, 0 skipped, 1 failed", stdout.getvalue()
+        )
+        self.assertIn("Line 6", stderr.getvalue())
+        self.assertEqual(Product.objects.get(product_no="P-0").price, 50)
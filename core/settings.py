@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # 3rd Party
     "django_countries",
     "django_filters",
@@ -104,6 +105,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -153,8 +174,18 @@ cloudinary.config(
     api_secret=config("CLOUDINARY_API_SECRET"),
 )
 
-# MEDIA_URL = "/media/"
-# MEDIA_ROOT = PROJECT_ROOT / "media"
+MEDIA_URL = "/media/"
+MEDIA_ROOT = config("MEDIA_ROOT", default=os.path.join(BASE_DIR, "media"))
+# Uploads are read back by the Celery worker, which may run on another host,
+# so they are not kept on the local disk by default.
+DEFAULT_FILE_STORAGE = config(
+    "DEFAULT_FILE_STORAGE", default="core.config.storage.CloudinaryFileStorage"
+)
+IMAGE_STORAGE_BACKEND = config(
+    "IMAGE_STORAGE_BACKEND", default="core.config.media.CloudinaryImageStorage"
+)
+IMAGE_UPLOAD_WORKERS = config("IMAGE_UPLOAD_WORKERS", default=4, cast=int)
+IMAGE_UPLOAD_MAX_FILES = config("IMAGE_UPLOAD_MAX_FILES", default=20, cast=int)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
@@ -187,8 +218,56 @@ REST_FRAMEWORK = {
 }
 
 
+# Celery
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://localhost:6379/0")
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BEAT_SCHEDULE = {
+    "flush-dirty-carts": {
+        "task": "core.cart.tasks.flush_dirty_carts",
+        "schedule": config("CART_FLUSH_INTERVAL", default=30, cast=int),
+    },
+    "process-webhook-events": {
+        "task": "core.cart.tasks.process_webhook_events",
+        "schedule": config("WEBHOOK_PROCESS_INTERVAL", default=10, cast=int),
+    },
+    "archive-stale-carts": {
+        "task": "core.cart.tasks.archive_stale_carts",
+        "schedule": config("CART_ARCHIVE_INTERVAL", default=60 * 60, cast=int),
+    },
+    "refresh-business-analytics": {
+        "task": "core.business.tasks.refresh_business_analytics",
+        "schedule": config("BUSINESS_ANALYTICS_INTERVAL", default=60 * 15, cast=int),
+    },
+}
+
+# The store needs a cache shared by web and Celery workers; locmem is per process.
+CART_STORE_ENABLED = config("CART_STORE_ENABLED", default=bool(REDIS_URL), cast=bool)
+CART_STORE_TIMEOUT = config("CART_STORE_TIMEOUT", default=60 * 60 * 24 * 7, cast=int)
+CART_ARCHIVE_IDLE_DAYS = config("CART_ARCHIVE_IDLE_DAYS", default=30, cast=int)
+CART_ARCHIVE_BATCH_SIZE = config("CART_ARCHIVE_BATCH_SIZE", default=500, cast=int)
+
+PRODUCT_IMPORT_CONFLICT_POLICY = config(
+    "PRODUCT_IMPORT_CONFLICT_POLICY", default="ignore"
+)
+
 GOOGLE_MAP_API_KEY = config("GOOGLE_MAP_API_KEY")
+GEOCODING_BACKEND = config(
+    "GEOCODING_BACKEND", default="core.config.geo.GoogleGeocoder"
+)
+GEOCODING_TIMEOUT = config("GEOCODING_TIMEOUT", default=5, cast=int)
+GEOCODING_LOCAL_PLACES = {}
 COINBASE_COMMERCE_API_KEY = config("COINBASE_COMMERCE_API_KEY")
+COINBASE_COMMERCE_API_URL = config(
+    "COINBASE_COMMERCE_API_URL", default="https://api.commerce.coinbase.com"
+)
+PAYMENT_CONNECT_TIMEOUT = config("PAYMENT_CONNECT_TIMEOUT", default=3.05, cast=float)
+PAYMENT_READ_TIMEOUT = config("PAYMENT_READ_TIMEOUT", default=10, cast=float)
+PAYMENT_POOL_SIZE = config("PAYMENT_POOL_SIZE", default=10, cast=int)
+CHECKOUT_CHARGE_TIMEOUT = config("CHECKOUT_CHARGE_TIMEOUT", default=120, cast=int)
+COINBASE_COMMERCE_WEBHOOK_SECRET = config(
+    "COINBASE_COMMERCE_WEBHOOK_SECRET", default=""
+)
 CLOUD_NAME = config("CLOUD_NAME")
 CLOUDINARY_API_KEY = config("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = config("CLOUDINARY_API_SECRET")